@@ -1,13 +1,324 @@
-from openai import OpenAI
-import os
+import asyncio
+import importlib.util
+import logging
+import threading
+import time
+from functools import cached_property
+
+from applog import log_event
+from metrics import CURRENT_SPAN, RequestMetrics, RequestSpan, RollingPercentile
+from ratelimit import AdaptiveLimiter, call_with_retry
+from tokens import estimate_tokens
+
+# httpx 的 HTTP/2 支持依赖 h2；只探测是否安装，不在启动时导入
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+DEFAULT_BASE_URL = "https://api.deepseek.com/v1"
+
+
+def estimate_prompt_tokens(messages):
+    return sum(estimate_tokens(m.get("content") or "") for m in messages)
+
+
+def usage_tokens(usage):
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+def reasoning_tokens(usage):
+    """Chain-of-thought tokens of a deepseek-reasoner completion, if reported"""
+    details = getattr(usage, "completion_tokens_details", None)
+    return getattr(details, "reasoning_tokens", None)
+
 
 class APIClient:
-    def __init__(self, api_key):
-        self.client = OpenAI(
-            base_url="https://api.deepseek.com/v1",
-            api_key=api_key
+    """Single transport layer for the DeepSeek API.
+
+    One pooled, keep-alive httpx client per flavour (sync and async) is shared
+    by every request, so warm connections are reused across turns instead of
+    paying a TCP+TLS handshake each time. The async client must only be used
+    from one event loop (the GUI's AsyncEngine loop).
+
+    Async calls go through ``limiter`` (an AdaptiveLimiter), which enforces
+    request/token budgets and adaptive concurrency and retries transient
+    failures; streams are only retried before the first chunk arrives.
+
+    With ``hedge=True`` a duplicate request is fired when the first one has
+    not responded within ``hedge_after`` seconds (default: rolling p95 of
+    time-to-first-response); the first to answer wins and the other is
+    cancelled. Hedges are skipped when the limiter has no spare slot.
+
+    Every async request records a RequestSpan (queue wait, connection setup,
+    time to first token, total time, token usage) into ``metrics``.
+
+    httpx and openai are only imported when a client is first needed (or
+    when ``prewarm()`` is called from a background thread), so constructing
+    an APIClient does not slow down application startup.
+    """
+
+    HEDGE_DEFAULT_AFTER = 3.0  # 样本不足时的对冲阈值（秒）
+    HEDGE_MIN_AFTER = 0.5
+    HEDGE_MIN_SAMPLES = 20
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL,
+                 max_connections=20, max_keepalive_connections=10,
+                 keepalive_expiry=120.0, connect_timeout=10.0,
+                 read_timeout=300.0, max_retries=0, limiter=None, metrics=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.limiter = limiter or AdaptiveLimiter()
+        self.hedge_after = None
+        self.first_response_latency = RollingPercentile()
+        self.metrics = metrics or RequestMetrics()
+        self.hedge_stats = self.metrics.hedges  # 随请求指标一起显示和导出
+        self.max_retries = max_retries
+        self._pool_options = dict(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._timeouts = (read_timeout, connect_timeout)
+        self._init_lock = threading.Lock()
+        self._http = None
+        self._async_http = None
+
+    def _ensure_http(self):
+        """Import httpx and build both pooled transports (once, thread-safe)"""
+        with self._init_lock:
+            if self._http is None:
+                import httpx
+
+                limits = httpx.Limits(**self._pool_options)
+                read_timeout, connect_timeout = self._timeouts
+                # 推理模式生成时间较长，读超时放宽；连接超时保持较短以便快速失败
+                timeout = httpx.Timeout(
+                    read_timeout,
+                    connect=connect_timeout,
+                    write=connect_timeout,
+                    pool=connect_timeout
+                )
+                self._async_http = httpx.AsyncClient(
+                    http2=HTTP2_AVAILABLE, limits=limits, timeout=timeout,
+                    event_hooks={"request": [self._attach_trace]}
+                )
+                self._http = httpx.Client(
+                    http2=HTTP2_AVAILABLE, limits=limits, timeout=timeout
+                )
+        return self._http, self._async_http
+
+    @cached_property
+    def client(self):
+        from openai import OpenAI
+
+        http, _ = self._ensure_http()
+        return OpenAI(
+            base_url=self.base_url,
+            api_key=self.api_key,
+            http_client=http,
+            max_retries=self.max_retries
+        )
+
+    @cached_property
+    def async_client(self):
+        from openai import AsyncOpenAI
+
+        _, async_http = self._ensure_http()
+        return AsyncOpenAI(
+            base_url=self.base_url,
+            api_key=self.api_key,
+            http_client=async_http,
+            max_retries=self.max_retries
+        )
+
+    @staticmethod
+    async def _attach_trace(request):
+        # 把连接建立事件记入当前请求的计时
+        span = CURRENT_SPAN.get()
+        if span is not None:
+            request.extensions["trace"] = span.trace
+
+    def _record(self, span, usage=None, error=None):
+        span.finish(usage, error)
+        self.metrics.record(span)
+        if error is None or span.cancelled:
+            log_event("api_request", verbose=True, **span.as_dict())
+        else:
+            log_event("api_request", logging.WARNING, **span.as_dict())
+
+    def prewarm(self):
+        """Import the HTTP/OpenAI stack ahead of the first request (call from a worker thread)"""
+        self._ensure_http()
+        from openai import OpenAI, AsyncOpenAI  # noqa: F401
+
+    def send_message(self, messages, model, **params):
+        """Blocking chat completion; returns the full response object"""
+        return self.client.chat.completions.create(
+            model=model, messages=messages, **params
         )
 
-    def send_message(self, message):
-        # 发送消息的逻辑
-        pass
+    def hedge_threshold(self):
+        if self.hedge_after is not None:
+            return self.hedge_after
+        if len(self.first_response_latency) < self.HEDGE_MIN_SAMPLES:
+            return self.HEDGE_DEFAULT_AFTER
+        return max(self.HEDGE_MIN_AFTER, self.first_response_latency.percentile(95))
+
+    async def _race(self, start):
+        """Run start(0), adding start(1) if it is slow; returns (index, result) of the first success"""
+        tasks = [asyncio.ensure_future(start(0))]
+        try:
+            # 等待对冲阈值期间调用方也可能被取消，因此同样放在try内
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_threshold())
+            if not done:
+                if self.limiter.in_flight < self.limiter.concurrency:
+                    self.hedge_stats.fired += 1
+                    tasks.append(asyncio.ensure_future(start(1)))
+                else:
+                    self.hedge_stats.skipped += 1
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        index = tasks.index(task)
+                        if index == 1:
+                            self.hedge_stats.won += 1
+                        logging.info(f"Hedging: {self.hedge_stats.summary()}")
+                        return index, task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # 取消落败的请求，其限流槽位在各自的finally中释放
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def send_message_async(self, messages, model, hedge=False, queued=0.0, **params):
+        """Async chat completion; returns the full response object.
+
+        ``queued`` is how long the caller already waited for its turn (e.g. in
+        SessionScheduler); it is counted in the request's queue_wait and total.
+        """
+        if hedge:
+            _, response = await self._race(
+                lambda i: self.send_message_async(messages, model, queued=queued if i == 0 else 0.0, **params)
+            )
+            return response
+        started = time.monotonic()
+        estimated = estimate_prompt_tokens(messages)
+        span = RequestSpan(model, queued=queued)
+        token = CURRENT_SPAN.set(span)
+        try:
+            response = await call_with_retry(
+                self.limiter,
+                lambda: self.async_client.chat.completions.create(
+                    model=model, messages=messages, **params
+                ),
+                estimated,
+                span
+            )
+        except BaseException as e:
+            self._record(span, error=e)
+            raise
+        finally:
+            CURRENT_SPAN.reset(token)
+        self._record(span, response.usage)
+        self.limiter.record_usage(estimated, usage_tokens(response.usage))
+        self.first_response_latency.add(time.monotonic() - started)
+        return response
+
+    async def stream_message(self, messages, model, hedge=False, queued=0.0, **params):
+        """Async generator yielding streamed completion chunks (``queued`` as in send_message_async)"""
+        if hedge:
+            async for chunk in self._stream_hedged(messages, model, queued, **params):
+                yield chunk
+            return
+        estimated = estimate_prompt_tokens(messages)
+        span = RequestSpan(model, stream=True, queued=queued)
+        attempt = 0
+        while True:
+            try:
+                span.on_attempt(await self.limiter.acquire(estimated))
+            except BaseException as e:
+                self._record(span, error=e)
+                raise
+            started = time.monotonic()
+            token = CURRENT_SPAN.set(span)
+            try:
+                stream = await self.async_client.chat.completions.create(
+                    model=model, messages=messages, stream=True, **params
+                )
+                break
+            except BaseException as e:
+                await self.limiter.release()
+                delay = self.limiter.backoff(e, attempt) if isinstance(e, Exception) else None
+                if delay is None:
+                    self._record(span, error=e)
+                    raise
+                logging.warning(f"API stream failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+            finally:
+                CURRENT_SPAN.reset(token)
+            attempt += 1
+            await asyncio.sleep(delay)
+        # 以响应头到达时间作为延迟信号，与回复长度无关
+        self.limiter.on_success(time.monotonic() - started)
+        usage = None
+        error = None
+        first = True
+        try:
+            async for chunk in stream:
+                if first:
+                    self.first_response_latency.add(time.monotonic() - started)
+                    span.on_first_chunk()
+                    first = False
+                if span.first_answer is None and chunk.choices and chunk.choices[0].delta.content:
+                    span.on_first_answer()
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            await stream.close()
+            await self.limiter.release()
+            self.limiter.record_usage(estimated, usage_tokens(usage))
+            self._record(span, usage, error)
+
+    async def _stream_hedged(self, messages, model, queued=0.0, **params):
+        streams, firsts = [], []
+
+        def start(i):
+            stream = self.stream_message(messages, model, queued=queued if i == 0 else 0.0, **params)
+            streams.append(stream)
+            firsts.append(asyncio.ensure_future(stream.__anext__()))
+            return firsts[-1]
+
+        async def close_finished(keep=None):
+            # __anext__仍在运行的生成器不能aclose，它会在任务被取消后自行结束
+            for stream, task in zip(streams, firsts):
+                if stream is not keep and task.done():
+                    await stream.aclose()
+
+        try:
+            index, first = await self._race(start)
+        except BaseException:
+            await close_finished()
+            raise
+        winner = streams[index]
+        await close_finished(keep=winner)
+        try:
+            yield first
+            async for chunk in winner:
+                yield chunk
+        finally:
+            await winner.aclose()
+
+    def close(self):
+        if self._http is not None:
+            self._http.close()
+
+    async def aclose(self):
+        if self._async_http is not None:
+            await self._async_http.aclose()
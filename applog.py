@@ -0,0 +1,128 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+
+LOG_MAX_BYTES = 5 * 1024 * 1024  # 单个日志文件上限，超出后轮转
+LOG_BACKUPS = 3
+LOG_QUEUE_SIZE = 10000  # 队列满时丢弃记录，绝不阻塞调用方
+VERBOSE_SAMPLE_RATE = 0.1  # 详细记录（每次请求的计时等）只保留该比例
+# 这些字段包含对话内容，开启脱敏时只记录长度
+CONTENT_FIELDS = frozenset({"content", "prompt", "reply", "reasoning", "messages"})
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+
+
+def log_event(event, level=logging.INFO, verbose=False, **fields):
+    """Log a structured event; the fields are serialized by the background writer, not the caller.
+
+    ``verbose`` records are sampled (see ``setup_logging``).
+    """
+    logger = logging.getLogger()
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields, "verbose": verbose})
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only ``rate`` of the records logged with ``verbose=True``"""
+
+    def __init__(self, rate=VERBOSE_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return not getattr(record, "verbose", False) or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record; content fields are replaced by their size when redacting"""
+
+    def __init__(self, redact=True):
+        super().__init__()
+        self.redact = redact
+
+    def _value(self, key, value):
+        if self.redact and key in CONTENT_FIELDS and value is not None:
+            return {"redacted": True, "chars": len(value) if isinstance(value, str) else len(str(value))}
+        return value
+
+    def format(self, record):
+        entry = {key: self._value(key, value) for key, value in getattr(record, "fields", {}).items()}
+        entry.update(
+            ts=round(record.created, 3),
+            level=record.levelname,
+            logger=record.name,
+            msg=record.getMessage(),  # 异常堆栈已由QueueHandler并入消息
+        )
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that counts and drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(path=None, level=logging.INFO, redact=True, sample_rate=VERBOSE_SAMPLE_RATE,
+                  max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS, console=True):
+    """Route the root logger through a queue to a background writer thread.
+
+    The caller only builds a LogRecord and enqueues it; JSON encoding, the
+    rotating JSONL file at ``path`` and the console output all happen on the
+    writer thread. Returns the root queue handler.
+    """
+    global _listener
+    shutdown_logging()
+    handlers = []
+    if path:
+        file_handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8'
+        )
+        file_handler.setFormatter(JsonFormatter(redact))
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return queue_handler
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread (safe to call more than once)"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is None:
+        return
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, logging.handlers.QueueHandler) and handler.queue is listener.queue:
+            root.removeHandler(handler)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+atexit.register(shutdown_logging)
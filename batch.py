@@ -0,0 +1,183 @@
+"""Headless batch runner: stream chat requests from a JSONL file to DeepSeek.
+
+Each input line is a JSON object with an optional ``id`` and either a
+``messages`` list or a ``prompt`` string; ``mode`` ("Chat"/"Reasoner") or
+``model`` may override the command-line default. Results are appended to
+the output JSONL as they finish, and lines already answered there are
+skipped, so a crashed run can simply be restarted.
+
+    python batch.py requests.jsonl -o results.jsonl --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+from api import APIClient
+from applog import setup_logging, shutdown_logging
+from config import MODE_MODELS, Config
+from metrics import RequestMetrics
+from ratelimit import AdaptiveLimiter
+
+
+def load_completed(output_path):
+    """Ids already answered successfully in an existing output file"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 崩溃时可能留下半行
+            if record.get("error") is None and "id" in record:
+                completed.add(str(record["id"]))
+    return completed
+
+
+def drop_partial_line(output_path):
+    """Truncate a torn last line left by a crash, so appended records start on a line of their own"""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, 'rb+') as file:
+        end = file.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(position - 65536, 0)
+            file.seek(start)
+            block = file.read(position - start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                cut = start + newline + 1
+                break
+            position = start
+        else:
+            cut = 0
+        if cut < end:
+            file.truncate(cut)
+
+
+def iter_requests(input_path, default_model):
+    """Yield (id, model, messages) for every line of the input file"""
+    with open(input_path, 'r', encoding='utf-8') as file:
+        for line_no, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            request_id = str(item.get("id", item.get("request_id", line_no)))
+            model = item.get("model") or MODE_MODELS.get(item.get("mode"), default_model)
+            messages = item.get("messages")
+            if messages is None:
+                prompt = item.get("prompt") or item.get("content") or item.get("body") or ""
+                messages = [{"role": "user", "content": prompt}]
+            yield request_id, model, messages
+
+
+async def run_batch(api_client, input_path, output_path, default_model,
+                    concurrency=4, params=None):
+    """Run every pending request with at most ``concurrency`` in flight"""
+    completed = load_completed(output_path)
+    # 半行记录不在completed中，会被重新请求；先截掉它，避免新记录接在其后无法解析
+    drop_partial_line(output_path)
+    slots = asyncio.Semaphore(concurrency)
+    write_lock = asyncio.Lock()
+    stats = {"ok": 0, "failed": 0, "skipped": 0}
+
+    with open(output_path, 'a', encoding='utf-8') as output:
+
+        async def write(record):
+            async with write_lock:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+
+        async def run_one(request_id, model, messages):
+            started = time.perf_counter()
+            record = {"id": request_id, "model": model}
+            try:
+                response = await api_client.send_message_async(messages, model, **(params or {}))
+                record["reply"] = response.choices[0].message.content
+                record["usage"] = response.usage.model_dump() if response.usage else None
+                record["error"] = None
+                stats["ok"] += 1
+            except Exception as e:
+                record["error"] = str(e)
+                stats["failed"] += 1
+                logging.error(f"Request {request_id} failed: {e}")
+            finally:
+                slots.release()
+            record["elapsed"] = round(time.perf_counter() - started, 3)
+            await write(record)
+
+        tasks = set()
+        for request_id, model, messages in iter_requests(input_path, default_model):
+            if request_id in completed:
+                stats["skipped"] += 1
+                continue
+            # 先占用并发槽位再创建任务，输入文件再大也只保留有限的任务
+            await slots.acquire()
+            task = asyncio.create_task(run_one(request_id, model, messages))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL file of chat requests against DeepSeek")
+    parser.add_argument("input", help="input JSONL file")
+    parser.add_argument("-o", "--output", help="output JSONL file (default: <input>.results.jsonl)")
+    parser.add_argument("-m", "--mode", choices=sorted(MODE_MODELS), default="Chat")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=int, default=300, help="requests per minute budget")
+    parser.add_argument("--tpm", type=int, default=2_000_000, help="tokens per minute budget")
+    parser.add_argument("--api-key", default=None, help="defaults to DEEPSEEK_API_KEY")
+    parser.add_argument("--temperature", type=float, default=None)
+    parser.add_argument("--metrics", default=None,
+                        help="write per-request timings to this file (.jsonl, or .prom for Prometheus text)")
+    parser.add_argument("--log", default=None, help="also write structured JSONL logs to this file (rotated)")
+    parser.add_argument("--log-content", action="store_true", help="do not redact message content in --log")
+    args = parser.parse_args(argv)
+
+    setup_logging(args.log, redact=not args.log_content)
+    api_key = args.api_key or Config.get_api_key()
+    if not api_key:
+        parser.error("no API key: pass --api-key or set DEEPSEEK_API_KEY")
+    output_path = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    params = {} if args.temperature is None else {"temperature": args.temperature}
+
+    async def _run():
+        limiter = AdaptiveLimiter(
+            rpm=args.rpm, tpm=args.tpm,
+            initial_concurrency=min(3, args.concurrency), max_concurrency=args.concurrency
+        )
+        metrics = RequestMetrics(path=args.metrics)
+        api_client = APIClient(api_key, limiter=limiter, metrics=metrics)
+        try:
+            stats = await run_batch(
+                api_client, args.input, output_path, MODE_MODELS[args.mode],
+                concurrency=args.concurrency, params=params
+            )
+            return stats, metrics.summary()
+        finally:
+            await api_client.aclose()
+            api_client.close()
+            metrics.close()
+
+    try:
+        stats, summary = asyncio.run(_run())
+        logging.info(f"Batch finished: {stats['ok']} ok, {stats['failed']} failed, "
+                     f"{stats['skipped']} already done -> {output_path}")
+        logging.info("Request timings:\n" + summary)
+    finally:
+        shutdown_logging()
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
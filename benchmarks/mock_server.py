@@ -0,0 +1,237 @@
+"""Offline stand-in for the DeepSeek (OpenAI-compatible) chat completions API.
+
+Answers ``POST /v1/chat/completions`` with a canned reply after a
+configurable time to first token, generates tokens at a configurable rate,
+can inject errors (429 with Retry-After, or 5xx) and supports streaming with
+``stream_options.include_usage``. Requests for a ``*reasoner`` model first
+produce ``reasoning_content``, like deepseek-reasoner. Point the app or
+APIClient at ``http://127.0.0.1:<port>/v1``.
+
+    python benchmarks/mock_server.py --port 8765 --latency 0.3 --tokens-per-second 80
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokens import estimate_tokens  # noqa: E402
+
+STREAM_CHUNKS_PER_SECOND = 50  # 高token速率时合并发送，避免sleep精度成为瓶颈
+
+
+class MockSettings:
+    def __init__(self, latency=0.2, tokens_per_second=200.0, reply_tokens=50,
+                 error_rate=0.0, error_status=429, retry_after=0, seed=None,
+                 reasoning_tokens=100):
+        self.latency = latency  # 首个token之前的服务器耗时（秒）
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.reasoning_tokens = reasoning_tokens  # 仅对 reasoner 模型生效
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def settings(self):
+        return self.server.settings
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("content-length") or 0))
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        try:
+            request = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "invalid JSON", "type": "invalid_request_error"}})
+            return
+        with self.server.lock:
+            self.server.requests += 1
+            fail = self.settings.random.random() < self.settings.error_rate
+            if fail:
+                self.server.errors += 1
+        time.sleep(self.settings.latency)
+        if fail:
+            self._send_error()
+        elif request.get("stream"):
+            self._stream(request)
+        else:
+            self._complete(request)
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self):
+        status = self.settings.error_status
+        headers = {"retry-after": str(self.settings.retry_after)} if status == 429 else None
+        self._send_json(status, {"error": {"message": "injected error", "type": "mock_error"}}, headers)
+
+    def _reasoning_tokens(self, request):
+        return self.settings.reasoning_tokens if request.get("model", "").endswith("reasoner") else 0
+
+    def _usage(self, request):
+        prompt = sum(estimate_tokens(m.get("content") or "") for m in request.get("messages", []))
+        reasoning = self._reasoning_tokens(request)
+        completion = self.settings.reply_tokens + reasoning
+        usage = {
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": prompt + completion,
+            "prompt_cache_hit_tokens": 0,
+            "prompt_cache_miss_tokens": prompt,
+        }
+        if reasoning:
+            usage["completion_tokens_details"] = {"reasoning_tokens": reasoning}
+        return usage
+
+    def _envelope(self, request, obj):
+        return {
+            "id": f"mock-{uuid.uuid4().hex[:12]}",
+            "object": obj,
+            "created": int(time.time()),
+            "model": request.get("model", "deepseek-chat"),
+        }
+
+    def _complete(self, request):
+        reasoning = self._reasoning_tokens(request)
+        time.sleep((self.settings.reply_tokens + reasoning) / self.settings.tokens_per_second)
+        payload = self._envelope(request, "chat.completion")
+        message = {"role": "assistant", "content": "tok " * self.settings.reply_tokens}
+        if reasoning:
+            message["reasoning_content"] = "think " * reasoning
+        payload["choices"] = [{"index": 0, "message": message, "finish_reason": "stop"}]
+        payload["usage"] = self._usage(request)
+        self._send_json(200, payload)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _event(self, payload):
+        self._write_chunk(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+
+    def _stream(self, request):
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+        envelope = self._envelope(request, "chat.completion.chunk")
+
+        def chunk(delta, finish_reason=None):
+            return dict(envelope, choices=[{"index": 0, "delta": delta, "finish_reason": finish_reason}])
+
+        self._event(chunk({"role": "assistant", "content": ""}))
+        per_chunk = max(1, int(self.settings.tokens_per_second / STREAM_CHUNKS_PER_SECOND))
+        for field, word, total in (("reasoning_content", "think ", self._reasoning_tokens(request)),
+                                   ("content", "tok ", self.settings.reply_tokens)):
+            remaining = total
+            while remaining > 0:
+                count = min(per_chunk, remaining)
+                time.sleep(count / self.settings.tokens_per_second)
+                self._event(chunk({field: word * count}))
+                remaining -= count
+        self._event(chunk({}, "stop"))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._event(dict(envelope, choices=[], usage=self._usage(request)))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+
+class MockServer:
+    """Threaded mock API server; usable as a context manager"""
+
+    def __init__(self, host="127.0.0.1", port=0, settings=None, **options):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.settings = settings or MockSettings(**options)
+        self.httpd.lock = threading.Lock()
+        self.httpd.requests = 0
+        self.httpd.errors = 0
+        self._thread = None
+
+    @property
+    def settings(self):
+        return self.httpd.settings
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    @property
+    def errors(self):
+        return self.httpd.errors
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="MockServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline OpenAI-compatible mock of the DeepSeek API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--reply-tokens", type=int, default=50)
+    parser.add_argument("--reasoning-tokens", type=int, default=100, help="thinking tokens for *reasoner models")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--retry-after", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    server = MockServer(
+        args.host, args.port, latency=args.latency, tokens_per_second=args.tokens_per_second,
+        reply_tokens=args.reply_tokens, reasoning_tokens=args.reasoning_tokens, error_rate=args.error_rate,
+        error_status=args.error_status, retry_after=args.retry_after, seed=args.seed
+    )
+    print(f"Mock DeepSeek API listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
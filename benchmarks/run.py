@@ -0,0 +1,236 @@
+"""End-to-end performance suite, run entirely offline against the mock server.
+
+Measures request throughput and streaming time to first token through
+APIClient, the per-message cost of rendering into the chat display, and
+PDF/DOCX extraction speed on generated fixtures. Results are compared with
+a saved baseline; any metric that regresses by more than ``--tolerance``
+fails the run.
+
+    python benchmarks/run.py --save-baseline      # record this machine's baseline
+    python benchmarks/run.py                      # compare against it
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from api import APIClient  # noqa: E402
+from benchmarks.mock_server import MockServer  # noqa: E402
+from ratelimit import AdaptiveLimiter  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+MESSAGES = [{"role": "user", "content": "benchmark " * 50}]
+
+
+def result(value, unit, better="lower"):
+    return {"value": round(value, 4), "unit": unit, "better": better}
+
+
+async def _throughput(base_url, requests, concurrency):
+    limiter = AdaptiveLimiter(rpm=100_000, initial_concurrency=concurrency,
+                              max_concurrency=concurrency)
+    client = APIClient("mock-key", base_url=base_url, limiter=limiter)
+    try:
+        await client.send_message_async(MESSAGES, "deepseek-chat")  # 预热连接和openai客户端
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            client.send_message_async(MESSAGES, "deepseek-chat") for _ in range(requests)
+        ))
+        elapsed = time.perf_counter() - started
+    finally:
+        await client.aclose()
+        client.close()
+    return requests / elapsed
+
+
+async def _stream_ttft(base_url, requests):
+    client = APIClient("mock-key", base_url=base_url)
+    samples = []
+    try:
+        for _ in range(requests + 1):
+            started = time.perf_counter()
+            first = None
+            async for chunk in client.stream_message(MESSAGES, "deepseek-chat"):
+                if first is None and chunk.choices and chunk.choices[0].delta.content:
+                    first = time.perf_counter() - started
+            samples.append(first)
+    finally:
+        await client.aclose()
+        client.close()
+    return statistics.median(samples[1:])  # 第一次含建连，不计入
+
+
+def bench_api(args):
+    results = {}
+    with MockServer(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                    reply_tokens=50) as server:
+        rps = asyncio.run(_throughput(server.base_url, args.requests, args.concurrency))
+        results["api_throughput"] = result(rps, "req/s", better="higher")
+        # 含服务器设定的延迟，基线对比时只看变化
+        results["stream_ttft"] = result(asyncio.run(_stream_ttft(server.base_url, 20)), "s")
+    return results
+
+
+def bench_display(messages=2000, size=500):
+    """Per-message cost of TranscriptView.append (what display_message does); needs a display"""
+    import tkinter as tk
+    from transcript import Transcript, TranscriptView
+
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return {}
+    try:
+        root.withdraw()
+        text = tk.Text(root)
+        view = TranscriptView(text, Transcript())
+        content = "渲染测试 " * (size // 5)
+        started = time.perf_counter()
+        for i in range(messages):
+            view.append("user" if i % 2 == 0 else "assistant", content)
+            if i % 50 == 0:
+                root.update()
+        root.update()
+        elapsed = time.perf_counter() - started
+    finally:
+        root.destroy()
+    return {"display_append": result(elapsed / messages * 1000, "ms/message")}
+
+
+def make_pdf(path, pages=64, lines=40):
+    """Write a plain-text PDF (Helvetica, one content stream per page)"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # 页面树，页面对象编号确定后再填写
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(pages):
+        body = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(
+            f"(Page {page} line {line} the quick brown fox jumps over the lazy dog) Tj T*"
+            for line in range(lines)
+        ) + " ET"
+        stream = body.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), pages
+    )
+    with open(path, "wb") as file:
+        file.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, obj in enumerate(objects, 1):
+            offsets.append(file.tell())
+            file.write(b"%d 0 obj\n%s\nendobj\n" % (number, obj))
+        xref = file.tell()
+        file.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            file.write(b"%010d 00000 n \n" % offset)
+        file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def make_docx(path, paragraphs=2000, tables=20):
+    from docx import Document
+
+    doc = Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(f"第 {i} 段：这是一段用于解析性能测试的中文文本，包含一些 English words。")
+        if i % (paragraphs // tables) == 0:
+            table = doc.add_table(rows=5, cols=4)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = "cell"
+    doc.save(path)
+
+
+def bench_extraction(workdir):
+    from extraction import extract_docx, extract_pdf
+
+    results = {}
+    pdf_path = os.path.join(workdir, "fixture.pdf")
+    make_pdf(pdf_path, pages=64)
+    started = time.perf_counter()
+    text = extract_pdf(pdf_path)
+    elapsed = time.perf_counter() - started
+    assert "Page 63 line 39" in text, "PDF fixture was not extracted"
+    results["pdf_extract"] = result(elapsed / 64 * 1000, "ms/page")
+
+    docx_path = os.path.join(workdir, "fixture.docx")
+    make_docx(docx_path)
+    started = time.perf_counter()
+    extract_docx(docx_path)
+    results["docx_extract"] = result(time.perf_counter() - started, "s")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Names of metrics that regressed more than ``tolerance`` (fraction) against the baseline"""
+    failures = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or not previous["value"]:
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        if current["better"] == "higher":
+            change = -change
+        if change > tolerance:
+            failures.append(f"{name}: {current['value']} {current['unit']} vs baseline "
+                            f"{previous['value']} ({change:+.0%})")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression (0.25 = 25%%)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="mock server time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--only", choices=["api", "display", "extraction"], action="append")
+    args = parser.parse_args(argv)
+
+    only = set(args.only or ["api", "display", "extraction"])
+    results = {}
+    if "api" in only:
+        results.update(bench_api(args))
+    if "display" in only:
+        results.update(bench_display())
+    if "extraction" in only:
+        with tempfile.TemporaryDirectory() as workdir:
+            results.update(bench_extraction(workdir))
+
+    for name, r in results.items():
+        print(f"{name:>22}: {r['value']} {r['unit']}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --save-baseline to record one")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    failures = compare(results, baseline, args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
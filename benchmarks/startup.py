@@ -0,0 +1,107 @@
+"""Startup-time benchmark: module import time and time to first window.
+
+Every sample runs in a fresh interpreter so nothing is cached between runs.
+Heavy dependencies (openai, httpx, python-docx, PyPDF2) must not be imported
+while the app starts; the benchmark fails if they are, or if a median goes
+over the given budget.
+
+    python benchmarks/startup.py --runs 10 --max-import-ms 300 --max-window-ms 800
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("openai", "httpx", "docx", "PyPDF2")
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+WINDOW_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import chatWithDs
+gui = chatWithDs.ChatbotGUI()
+gui.root.update()
+elapsed = time.perf_counter() - started
+heavy = [m for m in {heavy!r} if m in sys.modules]
+gui.root.destroy()
+gui.engine.stop()
+gui.store.close()
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+
+def run_probe(code, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=workdir, env=env,
+        capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(code, runs, workdir):
+    samples = [run_probe(code, workdir) for _ in range(runs)]
+    times = [s["seconds"] * 1000 for s in samples]
+    return {
+        "median_ms": round(statistics.median(times), 1),
+        "min_ms": round(min(times), 1),
+        "max_ms": round(max(times), 1),
+        "heavy_modules": sorted(set().union(*(s["heavy"] for s in samples))),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure chatWithDs startup time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="chatWithDs", help="module whose import time is measured")
+    parser.add_argument("--no-window", action="store_true", help="skip time-to-first-window (needs a display)")
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-window-ms", type=float, default=None)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    failures = []
+    results = {}
+    # 在临时目录中运行，避免在仓库中生成 .env
+    with tempfile.TemporaryDirectory() as workdir:
+        results["import"] = measure(
+            IMPORT_PROBE.format(module=args.module, heavy=HEAVY_MODULES), args.runs, workdir
+        )
+        if not args.no_window:
+            results["first_window"] = measure(WINDOW_PROBE.format(heavy=HEAVY_MODULES), args.runs, workdir)
+
+    for name, budget in (("import", args.max_import_ms), ("first_window", args.max_window_ms)):
+        result = results.get(name)
+        if result is None:
+            continue
+        if result["heavy_modules"]:
+            failures.append(f"{name}: heavy modules imported eagerly: {', '.join(result['heavy_modules'])}")
+        if budget is not None and result["median_ms"] > budget:
+            failures.append(f"{name}: median {result['median_ms']} ms exceeds {budget} ms")
+
+    if args.json:
+        print(json.dumps({"results": results, "failures": failures}, indent=2))
+    else:
+        for name, result in results.items():
+            print(f"{name:>12}: median {result['median_ms']} ms "
+                  f"(min {result['min_ms']}, max {result['max_ms']}, {args.runs} runs)")
+        for failure in failures:
+            print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
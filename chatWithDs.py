@@ -3,31 +3,363 @@ from tkinter import ttk, filedialog, messagebox
 import os
 import asyncio
 from dotenv import load_dotenv
-from docx import Document
-from PyPDF2 import PdfReader
-from openai import OpenAI
 import logging
 import ctypes
 from ctypes import sizeof, windll, byref, c_int
 import threading
+import itertools
+import hashlib
+import time
+import multiprocessing
 from concurrent.futures import ThreadPoolExecutor
-from threading import Semaphore
+from api import APIClient, reasoning_tokens
+from applog import log_event, setup_logging
+from config import MODE_MODELS, Config
+from engine import AsyncEngine
+from export import export_transcript
+from extraction import ExtractionCancelled, extract_docx, extract_pdf, extract_txt
+from extraction_cache import ExtractionCache
+from ingest import build_corpus
+from metrics import CacheStats, RequestMetrics
+from ratelimit import AdaptiveLimiter
+from response_cache import ResponseCache
+from retrieval import DocumentIndex, format_context
+from scheduler import SessionScheduler
+from store import ConversationStore
+from summarizer import map_reduce_summarize, update_memory
+from tokens import estimate_tokens
+from transcript import Transcript, TranscriptView
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# 各模型用于上下文（系统消息+历史+本轮输入）的token预算，为回复预留空间
+MODEL_TOKEN_BUDGETS = {
+    "deepseek-chat": 48000,
+    "deepseek-reasoner": 48000,
+}
+DEFAULT_TOKEN_BUDGET = 32000
+# 耗时较长的模型：在共享调度中不能占满全部并发名额
+LONG_RUNNING_MODELS = {"deepseek-reasoner"}
+MESSAGE_OVERHEAD_TOKENS = 4  # 每条消息的角色/分隔符开销
+# 超出预算时一次性裁剪到预算的该比例，使前缀在之后多轮中保持不变（利于上下文缓存命中）
+TRIM_LOW_WATER = 0.6
+# 压缩模式：窗口达到预算的该比例时，在后台把最早的几轮对话并入摘要，而不是等到被截断
+COMPACT_HIGH_WATER = 0.8
+MEMORY_PREFIX = "以下是本次对话早期内容的摘要：\n"
+
+# 超过该token数的文档不再整篇粘贴发送，而是建立本地索引按需检索
+DOC_INLINE_TOKENS = 6000
+RETRIEVAL_TOP_K = 5
+
+# 窗口显示后多久开始在后台预加载openai/python-docx/PyPDF2
+PREWARM_DELAY_MS = 300
+
+# 各模式固定的系统消息，始终位于消息列表首位
+SYSTEM_MESSAGES = {
+    "Chat": "",
+    "Reasoner": "",
+}
 
 class ConversationManager:
-    def __init__(self):
+    def __init__(self, token_budgets=None):
         self.history = []
-        self.max_length = 15  # 保持最近15组对话
+        self.token_counts = []  # 与history一一对应的token数
+        self.total_tokens = 0
+        self.token_budgets = dict(MODEL_TOKEN_BUDGETS if token_budgets is None else token_budgets)
+        self.dropped = 0  # 已从history头部移除的消息数，用于换算窗口起点
+        self._window_starts = {}  # model -> 发送窗口起点（绝对序号）
+        self.memory = ""  # 早期对话的滚动摘要
+        self.memory_tokens = 0
+        self.summarized = 0  # 已并入摘要的消息数（绝对序号）
+        self._compacting = False
+
+    @property
+    def token_budget(self):
+        """Largest budget of any model; history beyond this is never sent"""
+        return max(self.token_budgets.values(), default=DEFAULT_TOKEN_BUDGET)
+
+    def budget_for(self, model):
+        return self.token_budgets.get(model, DEFAULT_TOKEN_BUDGET)
 
     def add_message(self, role, content):
+        tokens = estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
         self.history.append({"role": role, "content": content})
-        if len(self.history) > self.max_length * 2:
-            self.history = self.history[-self.max_length * 2:]
+        self.token_counts.append(tokens)
+        self.total_tokens += tokens
+        self.trim(self.token_budget)
+
+    def _cut_point(self, start, total, budget):
+        """Index from which the history fits in budget, cut down to the low-water mark at a turn boundary"""
+        if total <= budget:
+            return start
+        target = budget * TRIM_LOW_WATER
+        end = len(self.history)
+        # 至少保留最新的一条消息
+        while start < end - 1 and total > target:
+            total -= self.token_counts[start]
+            start += 1
+        # 从用户消息处开始，避免以半轮对话开头
+        while start < end - 1 and self.history[start]["role"] != "user":
+            start += 1
+        return start
+
+    def trim(self, budget):
+        """Drop the oldest messages once the history exceeds budget"""
+        drop = self._cut_point(0, self.total_tokens, budget)
+        if drop:
+            self.total_tokens -= sum(self.token_counts[:drop])
+            del self.history[:drop]
+            del self.token_counts[:drop]
+            self.dropped += drop
+
+    def plan_compaction(self, model=None):
+        """Oldest messages to fold into the memory before they get evicted.
+
+        Returns ``(end, messages)`` once the unsummarized history passes the
+        high-water mark (``end`` is an absolute message number for
+        apply_compaction), or None. Only one compaction runs at a time.
+        """
+        if self._compacting:
+            return None
+        start = max(0, self.summarized - self.dropped)
+        total = sum(self.token_counts[start:]) + self.memory_tokens
+        high_water = self.budget_for(model) * COMPACT_HIGH_WATER
+        end = self._cut_point(start, total, high_water)
+        if end <= start:
+            return None
+        self._compacting = True
+        return end + self.dropped, [dict(m) for m in self.history[start:end]]
+
+    def apply_compaction(self, end, memory):
+        """Replace the memory with an updated summary covering messages before ``end``"""
+        self.memory = memory
+        self.memory_tokens = estimate_tokens(memory) + MESSAGE_OVERHEAD_TOKENS
+        self.summarized = max(self.summarized, end)
+        self._compacting = False
+
+    def cancel_compaction(self):
+        self._compacting = False
+
+    def build_messages(self, message, system_message="", model=None, retrieved=""):
+        """Assemble the outgoing message list in one pass.
+
+        The window start only moves when the model budget is exceeded, and
+        then jumps to the low-water mark, so the prefix stays byte-identical
+        across turns and DeepSeek's context cache keeps hitting. Messages
+        already folded into the memory summary are replaced by it.
+        """
+        if self.memory:
+            system_message = (system_message + "\n\n" if system_message else "") + MEMORY_PREFIX + self.memory
+        budget = (self.budget_for(model)
+                  - estimate_tokens(system_message) - estimate_tokens(message)
+                  - estimate_tokens(retrieved) - 2 * MESSAGE_OVERHEAD_TOKENS)
+        start = max(0, self._window_starts.get(model, 0) - self.dropped,
+                    self.summarized - self.dropped)
+        start = self._cut_point(start, sum(self.token_counts[start:]), budget)
+        self._window_starts[model] = start + self.dropped
+        messages = [{"role": "system", "content": system_message}]
+        messages.extend(self.history[start:])
+        # 检索片段只随本轮发送，不写入历史
+        messages.append({"role": "user", "content": retrieved + message})
+        return messages
+
+class ChatSession:
+    """One conversation tab: its own history, mode, transcript and streaming state.
+
+    Only the focused tab draws into its Text widget; a background tab keeps
+    streamed output in its Transcript and redraws once when selected again.
+    """
+
+    STREAM_FLUSH_MS = 40  # 流式输出刷新间隔（毫秒）
+    BACKGROUND_FLUSH_MS = 500  # 后台标签页只更新数据模型，不必频繁刷新
+
+    def __init__(self, gui, key, mode="Chat"):
+        self.root = gui.root
+        self.key = key  # 调度器中的会话标识
+        self.title = f"对话 {key}"
+        self.current_mode = tk.StringVar(value=mode)
+        self.conversation_manager = ConversationManager()
+        self.session_id = None  # 对话历史持久化：会话在第一条消息时才创建
+        self.active_documents = set()  # 本会话中参与检索的文档
+        self.active_requests = {}  # request id -> concurrent Future
+        self.background_requests = set()  # 不会被新消息打断的请求（如长文档总结）
+        self._request_ids = itertools.count(1)
+        self.pending = 0  # 尚未完成（含排队中）的对话轮次
+        self.closed = False
+        
+        self.frame = ttk.Frame(gui.notebook, style='Chat.TFrame')
+        self.chat_display = tk.Text(
+            self.frame,
+            wrap=tk.WORD,
+            state=tk.DISABLED,
+            height=15,
+            font=('Microsoft YaHei', 12),
+            bg=gui.colors['chat_bg'],
+            fg=gui.colors['input_fg'],
+            padx=10,
+            pady=10,
+            relief=tk.SOLID,
+            borderwidth=1
+        )
+        self.chat_display.pack(fill=tk.BOTH, expand=True)
+        
+        # Scrollbar
+        scrollbar = ttk.Scrollbar(self.frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        scrollbar.config(command=self.chat_display.yview)
+        
+        # 聊天记录以结构化模型保存，控件中只保留最近的消息，向上滚动时再分页加载
+        self.transcript = Transcript()
+        self.transcript_view = TranscriptView(
+            self.chat_display, self.transcript, scrollbar, colors=gui.colors
+        )
+        
+        # 流式输出状态：后台线程写入缓冲区，主线程按帧定时批量刷新
+        self._stream_buffer = []  # (stream id, kind, delta)
+        self._stream_lock = threading.Lock()
+        self._stream_active = False
+        self._stream_ids = itertools.count(1)
+        # 进行中的流式回复：stream id -> {"reasoning": 条目序号, "answer": 条目序号}
+        # 不打断时可能有多条回复同时在输出，各自写入自己的条目；已结束的流的残余片段被丢弃
+        self._streams = {}
+
+    def detach(self):
+        """Tab went to the background: stop drawing, keep recording"""
+        self.transcript_view.detach()
+
+    def attach(self):
+        """Tab was selected: draw what arrived in the meantime"""
+        self._flush_stream(reschedule=False)
+        self.transcript_view.attach()
+
+    def close(self):
+        """Cancel this tab's requests; nothing is drawn after this"""
+        self.closed = True
+        self.transcript_view.detach()
+        with self._stream_lock:
+            self._streams.clear()
+        self._stream_active = False
+        self.cancel_request()
+
+    def display_message(self, message, is_user=True):
+        """Display a message in the chat display"""
+        self.transcript_view.append("user" if is_user else "assistant", message)
+        
+    def display_notice(self, text):
+        """Show an informational line that is not part of the conversation"""
+        self.transcript_view.append("notice", text)
+        
+    def mark_from_cache(self):
+        """Append a marker after a reply served from the local cache"""
+        self.transcript_view.add_marker("  [来自缓存]")
+
+    def stream_display(self, message):
+        """Open an assistant entry that streamed deltas are appended to; returns its index"""
+        return self.transcript_view.append("assistant", message)
+
+    def begin_stream(self):
+        """Open a new streamed reply and start the frame-timed flush loop; returns the stream id.
+
+        Entries are opened on the first delta: a collapsible reasoning region
+        for reasoner output, then the assistant entry for the answer. Each
+        stream keeps its own entries, so a reply still streaming when the
+        next message is sent keeps filling its own entry.
+        """
+        self._flush_stream(reschedule=False)
+        stream_id = next(self._stream_ids)
+        with self._stream_lock:
+            self._streams[stream_id] = {"reasoning": None, "answer": None}
+        if not self._stream_active:
+            self._stream_active = True
+            self.root.after(self.STREAM_FLUSH_MS, self._flush_stream)
+        return stream_id
+        
+    def feed_stream(self, delta, stream_id, kind="answer"):
+        """Queue a streamed delta ("answer", "reasoning" or "reasoning_summary"); safe to call from any thread"""
+        with self._stream_lock:
+            if stream_id in self._streams:
+                self._stream_buffer.append((stream_id, kind, delta))
+            
+    def _flush_stream(self, reschedule=True):
+        """Insert buffered deltas with one Tk call per run of the same stream and kind"""
+        with self._stream_lock:
+            items = self._stream_buffer
+            self._stream_buffer = []
+            streams = dict(self._streams)
+        view = self.transcript_view
+        for (stream_id, kind), group in itertools.groupby(items, key=lambda item: item[:2]):
+            state = streams.get(stream_id)
+            if state is None:
+                continue
+            text = "".join(delta for _, _, delta in group)
+            if kind == "reasoning_summary":
+                if state["reasoning"] is not None:
+                    view.set_summary(state["reasoning"], text)
+            elif kind == "reasoning":
+                if state["answer"] is not None:
+                    continue
+                if state["reasoning"] is None:
+                    state["reasoning"] = view.append("reasoning", "")
+                # 按序号写入，期间插入的提示等条目不会被续写
+                view.append_text(text, state["reasoning"])
+            else:
+                if state["answer"] is None:
+                    # 正式回答开始后折叠思考过程
+                    if state["reasoning"] is not None:
+                        view.set_collapsed(state["reasoning"], True)
+                    state["answer"] = self.stream_display("")
+                view.append_text(text, state["answer"])
+        if reschedule and self._stream_active:
+            delay = self.BACKGROUND_FLUSH_MS if view.detached else self.STREAM_FLUSH_MS
+            self.root.after(delay, self._flush_stream)
+            
+    def end_stream(self, stream_id=None):
+        """Render what is left of one stream (or all of them) and stop accepting its deltas"""
+        self._flush_stream(reschedule=False)
+        with self._stream_lock:
+            if stream_id is None:
+                self._streams.clear()
+            else:
+                self._streams.pop(stream_id, None)
+            # 没有进行中的流时停止定时刷新
+            self._stream_active = bool(self._streams)
+
+    def preempt(self):
+        """Stop the replies in progress for a new message; what already streamed stays in their entries"""
+        self.cancel_request(preempt=True)
+        self.end_stream()
+
+    def track_request(self, future, background=False):
+        """Register an in-flight engine future so it can be cancelled; returns its id.
+
+        ``background`` requests are only stopped explicitly, never pre-empted by a new message.
+        """
+        request_id = next(self._request_ids)
+        self.active_requests[request_id] = future
+        if background:
+            self.background_requests.add(request_id)
+        future.add_done_callback(lambda f: self.root.after(0, self._untrack, request_id))
+        return request_id
+
+    def _untrack(self, request_id):
+        self.active_requests.pop(request_id, None)
+        self.background_requests.discard(request_id)
+        
+    def cancel_request(self, request_id=None, preempt=False):
+        """Cancel one in-flight request (or all of them); returns how many were cancelled.
+
+        Cancelling the engine task aborts the HTTP request/stream and frees its
+        rate-limiter and scheduler slots immediately. With ``preempt`` background
+        requests are left running.
+        """
+        if request_id is None:
+            futures = [future for key, future in list(self.active_requests.items())
+                       if not (preempt and key in self.background_requests)]
+        else:
+            futures = [self.active_requests.get(request_id)]
+        return sum(1 for future in futures if future is not None and future.cancel())
+
 
 class ChatbotGUI:
     def __init__(self):
@@ -58,11 +390,10 @@ class ChatbotGUI:
         # 设置默认字体
         self.root.option_add('*Font', ('Microsoft YaHei', 12))
         
-        # 设置当前模式
-        self.current_mode = tk.StringVar(value="Chat")
-        
-        # 初始化对话管理器
-        self.conversation_manager = ConversationManager()
+        # 标签页会话：每个标签页有独立的历史、模式和显示区域
+        self.sessions = {}  # notebook tab id -> ChatSession
+        self.session = None  # 当前标签页
+        self._session_keys = itertools.count(1)
         
         # API Key
         self.api_key = tk.StringVar()  # 使用StringVar来存储API密钥
@@ -70,18 +401,71 @@ class ChatbotGUI:
         self.check_and_create_env()
         self.prompt_for_api_key()
         
-        # Initialize OpenAI client
-        self.client = OpenAI(
-            base_url="https://api.deepseek.com/v1",
-            api_key=self.api_key.get()
+        # 后台常驻事件循环，负责所有API请求
+        self.engine = AsyncEngine().start()
+        
+        # 自适应限流：RPM/TPM预算 + AIMD并发控制 + 退避重试
+        self.rate_limiter = AdaptiveLimiter(initial_concurrency=3)
+        
+        # 各标签页共享的对话轮次调度：总并发跟随限流器，当前标签页优先，推理任务不占满名额
+        self.scheduler = SessionScheduler(concurrency=lambda: self.rate_limiter.concurrency)
+        
+        # 统一的API传输层（连接池 + keep-alive），异步部分只在engine循环中使用
+        # 每个请求的排队/建连/首字/总耗时记入 ~/.chatWithDs/metrics.jsonl
+        self.request_metrics = RequestMetrics(path=Config.data_path('metrics.jsonl'))
+        self.api_client = APIClient(
+            self.api_key.get(), limiter=self.rate_limiter, metrics=self.request_metrics
         )
         
-        self.api_semaphore = Semaphore(3)  # 限制并发请求数
+        # 上下文缓存命中统计
+        self.cache_stats = CacheStats()
+        
+        # 本地回复缓存（默认关闭，首次启用时才创建数据库）
+        self.use_cache = tk.BooleanVar(value=False)
+        self.bypass_cache = tk.BooleanVar(value=False)
+        self._response_cache = None
+        
+        # 长文档模式：超长文件分段并发总结，而不是建立检索索引
+        self.long_doc_mode = tk.BooleanVar(value=False)
+        
+        # 对冲请求：首个响应迟迟不到时补发一个请求，取先返回者
+        self.hedge_mode = tk.BooleanVar(value=False)
+        
+        # 取消进行中的请求时是否保留已生成的部分回答
+        self.keep_partial = tk.BooleanVar(value=True)
+        self.preempt_mode = tk.BooleanVar(value=True)  # 发送新消息时打断进行中的请求
+        
+        # 压缩模式：即将移出窗口的早期对话在后台汇总为摘要，而不是直接丢弃
+        self.compact_mode = tk.BooleanVar(value=False)
+        self._background_tasks = set()  # 引擎循环上的后台任务（不随停止按钮取消）
+        
+        self.stream_mode = tk.BooleanVar(value=True)
         
         self.setup_ui()
         
-        # Initialize thread pool
+        # Initialize thread pool (file processing only)
         self.thread_pool = ThreadPoolExecutor(max_workers=5)
+        self.extract_cancel = threading.Event()  # 取消正在进行的文件解析
+        self.extraction_cache = ExtractionCache()  # 按文件内容哈希缓存解析结果
+        self.document_index = DocumentIndex()  # 大文档的本地检索索引
+        
+        # 对话历史持久化：后台批量写入
+        self.store = ConversationStore()
+        
+        # 窗口显示后在后台预加载openai/httpx及文档解析库，首次发送和上传时无需等待导入
+        self.root.after(PREWARM_DELAY_MS, lambda: self.thread_pool.submit(self.prewarm))
+        
+    def prewarm(self):
+        """Import heavy dependencies in the background (worker thread)"""
+        started = time.perf_counter()
+        try:
+            self.api_client.prewarm()
+            import docx  # noqa: F401
+            import PyPDF2  # noqa: F401
+        except Exception as e:
+            logging.warning(f"Prewarm failed: {e}")
+            return
+        logging.info(f"Prewarmed dependencies in {time.perf_counter() - started:.2f}s")
         
     def setup_ui(self):
         # 定义字体
@@ -89,7 +473,7 @@ class ChatbotGUI:
         button_font = ('Microsoft YaHei', 16)  # 按钮使用大号字体
         text_font = ('Microsoft YaHei', 12)
         
-        # Chat display area
+        # Chat display area: one notebook tab per conversation
         self.chat_frame = ttk.Frame(self.root, style='Chat.TFrame')
         self.chat_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(5, 0))
         
@@ -107,26 +491,10 @@ class ChatbotGUI:
                        font=button_font,  # 使用大号字体
                        background=self.colors['bg'])
         
-        self.chat_display = tk.Text(
-            self.chat_frame,
-            wrap=tk.WORD,
-            state=tk.DISABLED,
-            height=15,
-            font=text_font,
-            bg=self.colors['chat_bg'],
-            fg=self.colors['input_fg'],
-            padx=10,
-            pady=10,
-            relief=tk.SOLID,
-            borderwidth=1
-        )
-        self.chat_display.pack(fill=tk.BOTH, expand=True)
-        
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(self.chat_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.chat_display.config(yscrollcommand=scrollbar.set)
-        scrollbar.config(command=self.chat_display.yview)
+        self.notebook = ttk.Notebook(self.chat_frame)
+        self.notebook.pack(fill=tk.BOTH, expand=True)
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+        self.new_session()
 
         # 创建一个框架来容纳loading和按钮
         self.control_frame = ttk.Frame(self.root, style='Chat.TFrame')
@@ -142,6 +510,14 @@ class ChatbotGUI:
         self.loading_label.pack(side=tk.LEFT, padx=(50, 0))  # 添加左侧padding
         self.loading_label.pack_forget()  # 初始时隐藏
         
+        # 文件解析取消按钮，仅在解析时显示
+        self.cancel_extract_btn = ttk.Button(
+            self.control_frame,
+            text="取消解析",
+            style='Custom.TButton',
+            command=self.cancel_extraction
+        )
+        
         # 创建模式选择框架
         self.mode_frame = ttk.Frame(self.control_frame, style='Chat.TFrame')
         self.mode_frame.pack(side=tk.LEFT, padx=(10, 0))
@@ -150,7 +526,7 @@ class ChatbotGUI:
         self.chat_mode = ttk.Radiobutton(
             self.mode_frame,
             text="聊天模式",
-            variable=self.current_mode,
+            variable=self.session.current_mode,
             value="Chat",
             style='Custom.TRadiobutton'  # 使用自定义样式
         )
@@ -159,16 +535,91 @@ class ChatbotGUI:
         self.reasoner_mode = ttk.Radiobutton(
             self.mode_frame,
             text="推理模式",
-            variable=self.current_mode,
+            variable=self.session.current_mode,
             value="Reasoner",
             style='Custom.TRadiobutton'  # 使用自定义样式
         )
         self.reasoner_mode.pack(side=tk.LEFT)
         
+        # 流式输出开关
+        self.stream_check = ttk.Checkbutton(
+            self.mode_frame,
+            text="流式输出",
+            variable=self.stream_mode
+        )
+        self.stream_check.pack(side=tk.LEFT, padx=(5, 0))
+        
+        # 本地回复缓存开关：跳过缓存时仍会用新回复刷新缓存
+        self.cache_check = ttk.Checkbutton(
+            self.mode_frame,
+            text="使用缓存",
+            variable=self.use_cache
+        )
+        self.cache_check.pack(side=tk.LEFT, padx=(5, 0))
+        
+        self.bypass_check = ttk.Checkbutton(
+            self.mode_frame,
+            text="跳过缓存",
+            variable=self.bypass_cache
+        )
+        self.bypass_check.pack(side=tk.LEFT, padx=(5, 0))
+        
+        self.long_doc_check = ttk.Checkbutton(
+            self.mode_frame,
+            text="长文档模式",
+            variable=self.long_doc_mode
+        )
+        self.long_doc_check.pack(side=tk.LEFT, padx=(5, 0))
+        
+        self.hedge_check = ttk.Checkbutton(
+            self.mode_frame,
+            text="对冲请求",
+            variable=self.hedge_mode
+        )
+        self.hedge_check.pack(side=tk.LEFT, padx=(5, 0))
+        
+        self.keep_partial_check = ttk.Checkbutton(
+            self.mode_frame,
+            text="停止时保留部分回答",
+            variable=self.keep_partial
+        )
+        self.keep_partial_check.pack(side=tk.LEFT, padx=(5, 0))
+        
+        self.preempt_check = ttk.Checkbutton(
+            self.mode_frame,
+            text="新消息打断",
+            variable=self.preempt_mode
+        )
+        self.preempt_check.pack(side=tk.LEFT, padx=(5, 0))
+        
+        self.compact_check = ttk.Checkbutton(
+            self.mode_frame,
+            text="压缩早期对话",
+            variable=self.compact_mode
+        )
+        self.compact_check.pack(side=tk.LEFT, padx=(5, 0))
+        
         # 创建一个框架来容纳按钮，使用place而不是pack
         self.button_container = ttk.Frame(self.control_frame, style='Chat.TFrame')
         self.button_container.pack(side=tk.LEFT, padx=(0, 5))
         
+        # Session tab buttons
+        self.new_tab_btn = ttk.Button(
+            self.button_container,
+            text="新对话",
+            style='Custom.TButton',
+            command=self.new_session
+        )
+        self.new_tab_btn.pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.close_tab_btn = ttk.Button(
+            self.button_container,
+            text="关闭对话",
+            style='Custom.TButton',
+            command=self.close_session
+        )
+        self.close_tab_btn.pack(side=tk.LEFT, padx=(0, 5))
+        
         # File upload button
         self.upload_btn = ttk.Button(
             self.button_container,
@@ -178,6 +629,15 @@ class ChatbotGUI:
         )
         self.upload_btn.pack(side=tk.LEFT, padx=(0, 5))
         
+        # Folder import button
+        self.folder_btn = ttk.Button(
+            self.button_container,
+            text="导入文件夹",
+            style='Custom.TButton',
+            command=self.upload_folder
+        )
+        self.folder_btn.pack(side=tk.LEFT, padx=(0, 5))
+        
         # Download button
         self.download_btn = ttk.Button(
             self.button_container,
@@ -187,6 +647,28 @@ class ChatbotGUI:
         )
         self.download_btn.pack(side=tk.LEFT)
         
+        # History button
+        self.history_btn = ttk.Button(
+            self.button_container,
+            text="历史记录",
+            style='Custom.TButton',
+            command=self.open_history
+        )
+        self.history_btn.pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Request stats button
+        self.stats_btn = ttk.Button(
+            self.button_container,
+            text="请求统计",
+            style='Custom.TButton',
+            command=self.open_stats
+        )
+        self.stats_btn.pack(side=tk.LEFT, padx=(5, 0))
+        
+        # 上下文缓存命中情况
+        self.cache_label = ttk.Label(self.control_frame, text="")
+        self.cache_label.pack(side=tk.LEFT, padx=(10, 0))
+        
         # Input area
         self.input_frame = ttk.Frame(self.root, style='Chat.TFrame')
         self.input_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -227,6 +709,15 @@ class ChatbotGUI:
         )
         self.send_btn.pack(side=tk.LEFT, padx=2)
         
+        # Stop button
+        self.stop_btn = ttk.Button(
+            self.button_frame,
+            text="停止",
+            style='Custom.TButton',
+            command=self.cancel_request
+        )
+        self.stop_btn.pack(side=tk.LEFT, padx=2)
+        
         # Clear button
         self.clear_btn = ttk.Button(
             self.button_frame,
@@ -251,22 +742,26 @@ class ChatbotGUI:
     def read_docx(self, file_path):
         """Read content from Word document"""
         try:
-            doc = Document(file_path)
-            return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+            return self.extraction_cache.get_or_extract(file_path, extract_docx)
         except Exception as e:
             logging.error(f"Error reading docx file: {e}")
             messagebox.showerror("Error", f"Could not read docx file: {e}")
             return None
         
-    def read_pdf(self, file_path):
+    def read_pdf(self, file_path, cancel_event=None):
         """Read content from PDF document"""
         try:
-            with open(file_path, 'rb') as file:
-                reader = PdfReader(file)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text()
-                return text
+            return self.extraction_cache.get_or_extract(
+                file_path,
+                lambda path: extract_pdf(
+                    path,
+                    progress=self.report_extract_progress,
+                    cancel_event=cancel_event
+                )
+            )
+        except ExtractionCancelled:
+            logging.info(f"PDF extraction cancelled: {file_path}")
+            return None
         except Exception as e:
             logging.error(f"Error reading pdf file: {e}")
             messagebox.showerror("Error", f"Could not read pdf file: {e}")
@@ -275,8 +770,7 @@ class ChatbotGUI:
     def read_txt(self, file_path):
         """Read content from text file"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
+            return self.extraction_cache.get_or_extract(file_path, extract_txt)
         except Exception as e:
             logging.error(f"Error reading txt file: {e}")
             messagebox.showerror("Error", f"Could not read txt file: {e}")
@@ -292,13 +786,21 @@ class ChatbotGUI:
             ('Text Files', '*.txt')
         ]
         
-        file_path = filedialog.askopenfilename(
+        file_paths = filedialog.askopenfilenames(
             title="Select File",
             filetypes=file_types
         )
         
-        if not file_path:
+        if not file_paths:
+            return
+        # 解析期间切换标签页，结果仍归属发起上传的会话
+        session = self.session
+        
+        # 多选时合并为一份去重后的资料，而不是逐个发送
+        if len(file_paths) > 1:
+            self.thread_pool.submit(self.ingest_files, list(file_paths), session)
             return
+        file_path = file_paths[0]
         
         if os.path.splitext(file_path)[1].lower() not in self.ALLOWED_EXTENSIONS:
             messagebox.showerror("Error", "Unsupported file type")
@@ -307,160 +809,571 @@ class ChatbotGUI:
         # Read content based on file type
         ext = os.path.splitext(file_path)[1].lower()
         if ext == '.docx':
-            self.thread_pool.submit(self.process_file, file_path, ext)
+            self.thread_pool.submit(self.process_file, file_path, ext, session)
         elif ext == '.pdf':
-            self.thread_pool.submit(self.process_file, file_path, ext)
+            self.thread_pool.submit(self.process_file, file_path, ext, session)
         elif ext == '.txt':
-            self.thread_pool.submit(self.process_file, file_path, ext)
+            self.thread_pool.submit(self.process_file, file_path, ext, session)
         else:
             messagebox.showerror("Error", "Unsupported file type")
             return
             
-    def process_file(self, file_path, ext):
+    def upload_folder(self):
+        """Import every supported file under a folder as one corpus"""
+        folder = filedialog.askdirectory(title="Select Folder")
+        if folder:
+            self.thread_pool.submit(self.ingest_files, [folder], self.session)
+            
+    def ingest_files(self, paths, session):
+        """Extract many files in parallel, deduplicate and handle them as one document (worker thread)"""
+        self.extract_cancel.set()
+        cancel_event = self.extract_cancel = threading.Event()
+        self.root.after(0, self.show_extracting, True)
+        
+        def progress(done, total):
+            self.root.after(0, lambda: self.loading_label.config(text=f"正在导入文件：{done}/{total} 个"))
+        
+        try:
+            content, stats = build_corpus(
+                paths, self.ALLOWED_EXTENSIONS, cache=self.extraction_cache,
+                progress=progress, cancel_event=cancel_event
+            )
+        except ExtractionCancelled:
+            logging.info("Batch import cancelled")
+            return
+        except Exception as e:
+            logging.error(f"Batch import failed: {e}")
+            msg = f"Could not import files: {e}"
+            self.root.after(0, messagebox.showerror, "Error", msg)
+            return
+        finally:
+            if self.extract_cancel is cancel_event:
+                self.root.after(0, self.show_extracting, False)
+        
+        for failure in stats["failed"]:
+            logging.warning(f"Import failed: {failure}")
+        summary = (f"已导入 {stats['included']}/{stats['files']} 个文件，"
+                   f"跳过重复文件 {stats['duplicate_files']} 个、重复段落 {stats['duplicate_blocks']} 处")
+        if stats["failed"]:
+            summary += f"，{len(stats['failed'])} 个文件解析失败"
+        if stats["truncated"]:
+            summary += f"，超出长度上限未导入 {stats['truncated']} 个文件"
+        self.root.after(0, session.display_notice, summary)
+        if not content or cancel_event.is_set():
+            return
+        name = f"{stats['included']}个文件"
+        digest = "corpus:" + hashlib.sha256(content.encode('utf-8')).hexdigest()
+        self.handle_document(session, name, content, digest)
+            
+    def report_extract_progress(self, done, total):
+        """Show per-page extraction progress (called from the worker thread)"""
+        self.root.after(0, lambda: self.loading_label.config(text=f"正在解析文件：{done}/{total} 页"))
+        
+    def cancel_extraction(self):
+        self.extract_cancel.set()
+        
+    def show_extracting(self, active):
+        """Toggle the loading indicator and cancel button while a file is parsed"""
+        if active:
+            self.loading_label.config(text="正在解析文件...")
+            self.loading_label.pack(side=tk.LEFT, padx=(50, 0))
+            self.cancel_extract_btn.pack(side=tk.LEFT, padx=(5, 0))
+        else:
+            self.cancel_extract_btn.pack_forget()
+            self.loading_label.pack_forget()
+            self.loading_label.config(text="加载中，请耐心等待loading...")
+            
+    def process_file(self, file_path, ext, session):
         """Process file in a separate thread"""
-        if ext == '.docx':
-            content = self.read_docx(file_path)
-        elif ext == '.pdf':
-            content = self.read_pdf(file_path)
-        elif ext == '.txt':
-            content = self.read_txt(file_path)
+        # 新上传的文件会取消上一次尚未完成的解析
+        self.extract_cancel.set()
+        cancel_event = self.extract_cancel = threading.Event()
+        self.root.after(0, self.show_extracting, True)
+        try:
+            if ext == '.docx':
+                content = self.read_docx(file_path)
+            elif ext == '.pdf':
+                content = self.read_pdf(file_path, cancel_event)
+            elif ext == '.txt':
+                content = self.read_txt(file_path)
+            else:
+                return
+        finally:
+            if self.extract_cancel is cancel_event:
+                self.root.after(0, self.show_extracting, False)
+        
+        if content and not cancel_event.is_set():
+            self.handle_document(session, file_path, content)
+            
+    def handle_document(self, session, file_path, content, digest=None):
+        """Send, index or summarize extracted text depending on its size (worker thread)"""
+        if estimate_tokens(content) > DOC_INLINE_TOKENS:
+            if self.long_doc_mode.get():
+                self.root.after(0, self.summarize_document, session, file_path, content)
+            else:
+                self.index_document(session, file_path, content, digest)
         else:
-            return
+            # Automatically send the content in the session that uploaded it
+            self.root.after(0, self.submit_message, session, content.strip())
+            
+    def index_document(self, session, file_path, content, digest=None):
+        """Index a large document for retrieval instead of pasting it (worker thread)"""
+        name = os.path.basename(file_path)
+        digest = digest or self.extraction_cache.digest_for(file_path)
+        doc_id, chunk_count = self.document_index.add_document(name, content, digest)
+        session.active_documents.add(doc_id)
+        self.root.after(0, session.display_notice,
+                        f"已索引文档《{name}》（{chunk_count} 个片段），提问时将自动引用相关内容")
+            
+    def summarize_document(self, session, file_path, content):
+        """Map-reduce summarize a document that exceeds the context window"""
+        name = os.path.basename(file_path)
+        model = MODE_MODELS[session.current_mode.get()]
+        session.display_message(f"[长文档总结] {name}", is_user=True)
+        self.loading_label.config(text="正在分段总结文档...")
+        self.loading_label.pack()
         
-        if content:
-            # Insert content into input box
-            self.root.after(0, self.insert_content, content)
+        def progress(done, total):
+            self.root.after(0, lambda: self.loading_label.config(text=f"正在分段总结文档：{done}/{total} 段"))
             
-            # Automatically send message
-            self.root.after(0, self.send_message_event)
+        def on_partial(index, summary):
+            self.root.after(0, session.display_notice, f"第 {index + 1} 段摘要：\n{summary}")
             
-    def insert_content(self, content):
-        """Insert content into input box"""
-        self.input_box.delete('1.0', tk.END)
-        self.input_box.insert('1.0', content)
+        future = self.engine.submit(self._summarize(session, name, content, model, progress, on_partial))
+        # 总结耗时较长，发送新消息时不打断，只能用停止按钮取消
+        session.track_request(future, background=True)
+        future.add_done_callback(
+            lambda f: self.root.after(0, self.on_summary_done, session, f, name)
+        )
         
-    async def send_message(self, message):
-        with self.api_semaphore:
-            try:
-                # 根据当前模式选择不同的模型和系统消息
-                if self.current_mode.get() == "Chat":
-                    model = "deepseek-chat"
-                    system_message = ""
-                else:  # Reasoner mode
-                    model = "deepseek-reasoner"
-                    system_message = ""
-                
-                # 构建完整的消息历史
-                messages = self.conversation_manager.history.copy()
-                if not any(msg["role"] == "system" for msg in messages):
-                    messages.insert(0, {"role": "system", "content": system_message})
-                messages.extend([
-                    msg for msg in self.conversation_manager.history 
-                    if msg["role"] in ("user", "assistant")
-                ])
-                messages.append({"role": "user", "content": message})
-                
-                response = await asyncio.to_thread(
-                    self.client.chat.completions.create,
-                    model=model,
-                    messages=messages
-                )
-                
-                logging.info(f"API Response: {response}")
-                
-                reply = response.choices[0].message.content
-                
-                # 更新对话历史
-                self.conversation_manager.add_message("user", message)
-                self.conversation_manager.add_message("assistant", reply)
-                
-                return reply
-                
-            except Exception as e:
-                logging.error(f"API call failed: {e}")
-                messagebox.showerror("Error", f"API call failed: {str(e)}")
-                return None
+    async def _summarize(self, session, name, content, model, progress, on_partial):
+        # 每个分段/合并调用各占一个长任务名额，保留的名额留给其他标签页的对话
+        summary = await map_reduce_summarize(
+            self.api_client, content, model,
+            semaphore=self.scheduler.slot(session.key, long=True),
+            progress=progress, on_partial=on_partial
+        )
+        # 与普通对话轮次一样在引擎循环中写入历史并持久化，便于后续追问
+        message = f"请总结文档《{name}》"
+        session.conversation_manager.add_message("user", message)
+        session.conversation_manager.add_message("assistant", summary)
+        self.persist_turn(session, message, summary, model)
+        return summary
 
-    def display_message(self, message, is_user=True):
-        """Display a message in the chat display"""
-        prefix = "You: " if is_user else "Assistant: "
-        tag_name = 'user_msg' if is_user else 'ai_msg'
+    def on_summary_done(self, session, future, name):
+        self.loading_label.pack_forget()
+        self.loading_label.config(text="加载中，请耐心等待loading...")
+        if session.closed:
+            return
+        if future.cancelled():
+            session.display_notice("[已停止]")
+            return
+        if future.exception() is not None:
+            logging.error(f"Summarization failed: {future.exception()}")
+            messagebox.showerror("Error", f"API call failed: {future.exception()}")
+            return
+        session.display_message(future.result(), is_user=False)
         
-        self.chat_display.config(state=tk.NORMAL)
-        if self.chat_display.get('1.0', tk.END).strip():
-            self.chat_display.insert(tk.END, '\n\n')
+    async def _collect_stream(self, session, model, messages, hedge=False, parts=None, stream_id=None, queued=0.0):
+        """Consume a streaming completion, feeding deltas to the display buffer.
+
+        Reasoner models stream their chain of thought as ``reasoning_content``
+        first; it is displayed in its own region and never returned, so it
+        cannot end up in the history.
+        """
+        parts = [] if parts is None else parts
+        reasoning = []
+        usage = None
+        started = time.monotonic()
+        answer_after = None
+        async for chunk in self.api_client.stream_message(
+            messages, model, hedge=hedge, queued=queued, stream_options={"include_usage": True}
+        ):
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            thought = getattr(chunk.choices[0].delta, "reasoning_content", None)
+            if thought:
+                reasoning.append(thought)
+                session.feed_stream(thought, stream_id, kind="reasoning")
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if answer_after is None:
+                    answer_after = time.monotonic() - started
+                parts.append(delta)
+                session.feed_stream(delta, stream_id)
+        if reasoning:
+            summary = self.reasoning_summary("".join(reasoning), usage, answer_after)
+            session.feed_stream(summary, stream_id, kind="reasoning_summary")
+        return "".join(parts), usage
         
-        # 创建带颜色的标签
-        self.chat_display.tag_config('user_msg', foreground=self.colors['button_fg'])
-        self.chat_display.tag_config('ai_msg', foreground=self.colors['button_fg'])
+    @staticmethod
+    def reasoning_summary(reasoning, usage, answer_after):
+        """Header text for a reasoning region: thinking tokens and time until the answer began"""
+        tokens = reasoning_tokens(usage) or estimate_tokens(reasoning)
+        logging.info(f"Reasoning: {tokens} tokens, answer after {answer_after or 0:.1f}s")
+        if answer_after is None:
+            return f"（{tokens} tokens）"
+        return f"（{tokens} tokens，{answer_after:.1f} 秒后开始回答）"
         
-        # 插入带颜色的消息
-        self.chat_display.insert(tk.END, prefix, tag_name)
-        self.chat_display.insert(tk.END, message)
+    @property
+    def response_cache(self):
+        if self._response_cache is None:
+            self._response_cache = ResponseCache()
+        return self._response_cache
         
-        self.chat_display.config(state=tk.DISABLED)
-        self.chat_display.see(tk.END)
+    async def send_message(self, session, message, mode, stream=None, use_cache=False, bypass_cache=False,
+                           hedge=False, keep_partial=True, compact=False):
+        """Run one chat turn of ``session`` on the engine loop; ``stream`` is the display stream id (None to not stream)"""
+        parts = []  # 已收到的流式片段，取消时用于保留部分回答
+        manager = session.conversation_manager
+        try:
+            # 根据会话的模式选择不同的模型和系统消息
+            model = MODE_MODELS[mode]
+            system_message = SYSTEM_MESSAGES.get(mode, "")
+            
+            # 从已索引文档中检索与问题相关的片段
+            retrieved = ""
+            if session.active_documents:
+                results = await asyncio.to_thread(
+                    self.document_index.search,
+                    message, RETRIEVAL_TOP_K, set(session.active_documents)
+                )
+                retrieved = format_context(results)
+            
+            # 构建完整的消息历史（按模型token预算截取，不重复）
+            messages = manager.build_messages(message, system_message, model, retrieved)
+            
+            cache_key = None
+            if use_cache:
+                cache_key = ResponseCache.make_key(model, messages)
+                if not bypass_cache:
+                    cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+                    if cached is not None:
+                        logging.info("Reply served from local cache")
+                        if stream:
+                            session.feed_stream(cached, stream)
+                        manager.add_message("user", message)
+                        manager.add_message("assistant", cached)
+                        self.persist_turn(session, message, cached, model)
+                        if compact:
+                            self.schedule_compaction(session, model)
+                        return cached, True, None
+            
+            reasoning = None
+            # 各标签页共享并发名额，排队时当前标签页优先
+            # 在调度器中排队的时间计入请求计时，区分排队与服务端耗时
+            async with self.scheduler.slot(session.key, long=model in LONG_RUNNING_MODELS) as queued:
+                if stream:
+                    reply, usage = await self._collect_stream(
+                        session, model, messages, hedge, parts, stream, queued
+                    )
+                    log_event("api_stream_finished", model=model, chars=len(reply or ""), content=reply)
+                else:
+                    started = time.monotonic()
+                    response = await self.api_client.send_message_async(
+                        messages, model, hedge=hedge, queued=queued
+                    )
+                    reply = response.choices[0].message.content or ""
+                    usage = response.usage
+                    # 只记录id、大小和状态；内容字段默认在写日志时脱敏
+                    log_event(
+                        "api_response", id=response.id, model=response.model,
+                        finish_reason=response.choices[0].finish_reason, chars=len(reply or ""),
+                        prompt_tokens=getattr(usage, "prompt_tokens", None),
+                        completion_tokens=getattr(usage, "completion_tokens", None),
+                        content=reply
+                    )
+                    # 思考过程只用于显示，不写入历史
+                    thought = getattr(response.choices[0].message, "reasoning_content", None)
+                    if thought:
+                        reasoning = (thought, self.reasoning_summary(thought, usage, time.monotonic() - started))
+            
+            if usage is not None:
+                self.cache_stats.record(usage)
+                log_event(
+                    "context_cache", hit_tokens=self.cache_stats.last_hit_tokens,
+                    miss_tokens=self.cache_stats.last_miss_tokens,
+                    hit_rate=round(self.cache_stats.hit_rate, 3)
+                )
+            
+            # 更新对话历史
+            manager.add_message("user", message)
+            manager.add_message("assistant", reply)
+            self.persist_turn(session, message, reply, model, usage)
+            if compact:
+                self.schedule_compaction(session, model)
+            
+            if cache_key is not None:
+                await asyncio.to_thread(self.response_cache.put, cache_key, model, reply)
+            
+            return reply, False, reasoning
+            
+        except asyncio.CancelledError:
+            logging.info("API call cancelled")
+            if keep_partial and parts:
+                manager.add_message("user", message)
+                manager.add_message("assistant", "".join(parts))
+                self.persist_turn(session, message, "".join(parts), model)
+            raise
+        except Exception as e:
+            logging.error(f"API call failed: {e}")
+            # e 在except块结束时被删除，消息需在块内生成
+            msg = f"API call failed: {e}"
+            self.root.after(0, messagebox.showerror, "Error", msg)
+            return None
 
-    def stream_display(self, message):
-        """Display a message in the chat display"""
-        prefix = "Assistant: "
-        tag_name = 'ai_msg'
+    def schedule_compaction(self, session, model):
+        """Start folding soon-to-be-evicted turns into the memory summary (engine loop, non-blocking)"""
+        job = session.conversation_manager.plan_compaction(model)
+        if job is None:
+            return
+        task = asyncio.ensure_future(self._compact(session, *job))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _compact(self, session, end, messages):
+        manager = session.conversation_manager
+        try:
+            # 摘要固定使用聊天模型，速度快且成本低；作为后台长任务参与会话调度
+            async with self.scheduler.slot(session.key, long=True):
+                memory = await update_memory(self.api_client, MODE_MODELS["Chat"], manager.memory, messages)
+        except BaseException as e:
+            manager.cancel_compaction()
+            if not isinstance(e, Exception):
+                raise
+            logging.warning(f"History compaction failed: {e}")
+            return
+        manager.apply_compaction(end, memory)
+        logging.info(f"Compacted {len(messages)} messages into a {manager.memory_tokens}-token summary")
+
+    def persist_turn(self, session, message, reply, model, usage=None):
+        """Queue one exchange for the conversation store (non-blocking)"""
+        if session.session_id is None:
+            session.session_id = ConversationStore.new_session_id()
+            self.store.add_session(session.session_id, message.strip().split('\n')[0])
+        self.store.add_message(session.session_id, "user", message, model)
+        self.store.add_message(session.session_id, "assistant", reply, model, usage)
+
+    def open_history(self):
+        """Browse and search past conversations"""
+        window = tk.Toplevel(self.root)
+        window.title("历史记录")
+        window.geometry("900x600")
+        
+        search_var = tk.StringVar()
+        search_entry = ttk.Entry(window, textvariable=search_var)
+        search_entry.pack(fill=tk.X, padx=10, pady=5)
+        
+        pane = ttk.PanedWindow(window, orient=tk.HORIZONTAL)
+        pane.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        results = tk.Listbox(pane, exportselection=False)
+        viewer = tk.Text(pane, wrap=tk.WORD, state=tk.DISABLED, bg=self.colors['chat_bg'])
+        pane.add(results, weight=1)
+        pane.add(viewer, weight=3)
+        
+        session_ids = []
+        pending = {"query": None}
+        
+        def show_rows(query, rows):
+            if query != pending["query"] or not window.winfo_exists():
+                return  # 已有更新的查询
+            results.delete(0, tk.END)
+            session_ids.clear()
+            for row in rows:
+                session_ids.append(row[0])
+                if query:
+                    results.insert(tk.END, f"{row[1]} | {row[4]}")
+                else:
+                    results.insert(tk.END, row[1])
+        
+        def run_query(query):
+            # 查询在线程池中执行，界面不等待磁盘
+            if query:
+                rows = self.store.search(query)
+            else:
+                rows = self.store.list_sessions()
+            self.root.after(0, show_rows, query, rows)
+        
+        def refresh(*args):
+            query = search_var.get().strip()
+            pending["query"] = query
+            self.thread_pool.submit(run_query, query)
         
-        self.chat_display.config(state=tk.NORMAL)
-        if self.chat_display.get('1.0', tk.END).strip():
-            self.chat_display.insert(tk.END, '\n')
+        def show_session(session_id, messages):
+            if not window.winfo_exists():
+                return
+            viewer.config(state=tk.NORMAL)
+            viewer.delete('1.0', tk.END)
+            viewer.insert(tk.END, "\n\n".join(
+                ("You: " if m["role"] == "user" else "Assistant: ") + m["content"]
+                for m in messages
+            ))
+            viewer.config(state=tk.DISABLED)
         
-        # 创建带颜色的标签
-        self.chat_display.tag_config('ai_msg', foreground=self.colors['button_fg'])
+        def on_select(event):
+            selection = results.curselection()
+            if not selection:
+                return
+            session_id = session_ids[selection[0]]
+            future = self.thread_pool.submit(self.store.load_messages, session_id)
+            future.add_done_callback(
+                lambda f: f.exception() is None and self.root.after(0, show_session, session_id, f.result())
+            )
         
-        # 插入带颜色的消息
-        self.chat_display.insert(tk.END, prefix, tag_name)
-        self.chat_display.insert(tk.END, message)
+        search_var.trace_add('write', refresh)
+        results.bind('<<ListboxSelect>>', on_select)
+        search_entry.focus_set()
+        refresh()
+
+    STATS_REFRESH_MS = 1000  # 统计面板刷新间隔（毫秒）
+
+    def open_stats(self):
+        """Live panel of rolling request latency percentiles and throughput"""
+        window = tk.Toplevel(self.root)
+        window.title("请求统计")
+        label = ttk.Label(window, justify=tk.LEFT, font=('Microsoft YaHei', 11))
+        label.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        def refresh():
+            if not window.winfo_exists():
+                return
+            text = self.request_metrics.summary()
+            last = self.request_metrics.last
+            if last is not None:
+                text += (f"\n\n最近一次：排队 {last['queue_wait']}s，建连 {last['connect']}s，"
+                         f"首字 {last['ttft']}s，总耗时 {last['total']}s")
+            text += f"\n并发上限 {self.rate_limiter.concurrency}，进行中 {self.rate_limiter.in_flight}"
+            text += f"\n{self.scheduler.summary()}，{len(self.sessions)} 个标签页"
+            label.config(text=text)
+            window.after(self.STATS_REFRESH_MS, refresh)
         
-        self.chat_display.config(state=tk.DISABLED)
-        self.chat_display.see(tk.END)
+        refresh()
+
+    def new_session(self):
+        """Open a conversation in a new tab, in the current tab's mode"""
+        mode = self.session.current_mode.get() if self.session is not None else "Chat"
+        session = ChatSession(self, next(self._session_keys), mode)
+        self.sessions[str(session.frame)] = session
+        if self.session is None:
+            self.session = session
+            self.scheduler.focus(session.key)
+        self.notebook.add(session.frame, text=session.title)
+        self.notebook.select(session.frame)
+        return session
+
+    def close_session(self):
+        """Close the current tab and cancel its requests; the last tab stays open"""
+        if len(self.sessions) <= 1:
+            return
+        session = self.session
+        session.close()
+        del self.sessions[str(session.frame)]
+        self.notebook.forget(session.frame)
+        session.frame.destroy()
+        self.on_tab_changed()
+
+    def on_tab_changed(self, event=None):
+        """Draw the newly selected tab and give its turns scheduling priority"""
+        session = self.sessions.get(self.notebook.select())
+        if session is None or session is self.session:
+            return
+        self.session.detach()
+        self.session = session
+        session.attach()
+        self.scheduler.focus(session.key)
+        self.chat_mode.config(variable=session.current_mode)
+        self.reasoner_mode.config(variable=session.current_mode)
+        self.update_session_status(session)
+        self.input_box.focus_set()
+
+    def update_session_status(self, session):
+        """Mark busy tabs in their title; the loading indicator follows the current tab"""
+        if session.closed:
+            return
+        busy = " …" if session.pending else ""
+        self.notebook.tab(session.frame, text=session.title + busy)
+        if session is self.session:
+            if session.pending:
+                self.loading_label.pack()
+            else:
+                self.loading_label.pack_forget()
 
     def send_message_event(self, event=None):
         """Event handler for send message"""
         message = self.input_box.get('1.0', tk.END).strip()
         if not message:
             return
-
-        # Display user message
-        self.display_message(message, is_user=True)
         
         # Clear input box
         self.input_box.delete('1.0', tk.END)
         self.input_box.focus_set()  # 发送后重新获得焦点
         
+        self.submit_message(self.session, message)
+        
+    def submit_message(self, session, message):
+        """Display a user message in ``session`` and send it through the shared scheduler"""
+        if not message:
+            return
+        
+        if self.preempt_mode.get():
+            # 已收到的片段写回被打断回复自己的条目，之后的残余片段被丢弃
+            session.preempt()
+        
+        stream = session.begin_stream() if self.stream_mode.get() else None
+        
+        # Display user message
+        session.display_message(message, is_user=True)
+        
         # Show loading indicator
-        self.loading_label.pack()
+        session.pending += 1
+        self.update_session_status(session)
         self.root.update()
 
-        # Create a new thread to handle the async operation
-        def async_handler():
-            async def async_operation():
-                try:
-                    # Get AI response
-                    ai_response = await self.send_message(message)
-                    if ai_response:
-                        # Schedule the UI update in the main thread
-                        self.root.after(0, lambda: self.display_message(ai_response, is_user=False))
-                finally:
-                    # Schedule hiding the loading indicator in the main thread
-                    self.root.after(0, lambda: self.loading_label.pack_forget())
-                    self.root.after(0, self.root.update)
-
-            # Create and run the event loop
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                loop.run_until_complete(async_operation())
-            finally:
-                loop.close()
-
-        # Start the async handler in a separate thread
-        threading.Thread(target=async_handler, daemon=True).start()
+        # 提交到后台事件循环，完成后回到主线程更新界面
+        future = self.engine.submit(self.send_message(
+            session,
+            message,
+            session.current_mode.get(),
+            stream=stream,
+            use_cache=self.use_cache.get(),
+            bypass_cache=self.bypass_cache.get(),
+            hedge=self.hedge_mode.get(),
+            keep_partial=self.keep_partial.get(),
+            compact=self.compact_mode.get()
+        ))
+        session.track_request(future)
+        future.add_done_callback(
+            lambda f: self.root.after(0, self.on_reply_done, session, f, stream)
+        )
+        
+    def cancel_request(self, request_id=None):
+        """Cancel in-flight requests of the current tab; returns how many were cancelled"""
+        return self.session.cancel_request(request_id)
+        
+    def on_reply_done(self, session, future, stream):
+        """Render the finished request on the Tk thread"""
+        session.pending -= 1
+        if session.closed:
+            return
+        ai_response, from_cache, reasoning = None, False, None
+        if not future.cancelled() and future.exception() is None and future.result():
+            ai_response, from_cache, reasoning = future.result()
+        if stream:
+            session.end_stream(stream)
+        elif ai_response:
+            if reasoning:
+                thought, summary = reasoning
+                session.transcript_view.append("reasoning", thought, collapsed=True, summary=summary)
+            session.display_message(ai_response, is_user=False)
+        if future.cancelled():
+            session.display_notice("[已停止]")
+        if from_cache:
+            session.mark_from_cache()
+        self.update_session_status(session)
+        if self.cache_stats.requests:
+            self.cache_label.config(text=self.cache_stats.summary())
 
     def handle_return(self, event):
         """智能处理回车键事件"""
@@ -489,70 +1402,47 @@ class ChatbotGUI:
         return None
 
     def download_chat(self):
-        """将聊天内容下载为Word文档"""
-        try:
-            # 获取保存文件的路径
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".docx",
-                filetypes=[("Word Document", "*.docx")],
-                title="Save Chat As"
-            )
-            
-            if not file_path:  # 如果用户取消了保存对话框
-                return
-                
-            # 创建新的Word文档
-            doc = Document()
-            
-            # 设置默认字体为雅黑
-            style = doc.styles['Normal']
-            style.font.name = 'Microsoft YaHei'
-            
-            # 添加标题
-            heading = doc.add_heading('Chat History', 0)
-            heading.style.font.name = 'Microsoft YaHei'  # 标题也使用雅黑字体
-            
-            # 获取聊天内容
-            chat_content = self.chat_display.get('1.0', tk.END).strip()
-            
-            # 如果聊天内容为空
-            if not chat_content:
-                messagebox.showinfo("Info", "No chat content to download.")
-                return
-                
-            # 按行分割聊天内容
-            lines = chat_content.split('\n')
-            current_paragraph = []
-            
-            # 处理每一行
-            for line in lines:
-                if line.strip():  # 如果不是空行
-                    if line.startswith(("You:", "Assistant:")):  # 新消息开始
-                        # 如果有累积的段落内容，先添加它
-                        if current_paragraph:
-                            p = doc.add_paragraph()
-                            p.add_run(''.join(current_paragraph)).font.name = 'Microsoft YaHei'
-                            current_paragraph = []
-                        # 添加新的发言者标记
-                        p = doc.add_paragraph()
-                        run = p.add_run(line)
-                        run.bold = True
-                        run.font.name = 'Microsoft YaHei'
-                    else:
-                        current_paragraph.append(line + '\n')
-            
-            # 添加最后一个段落
-            if current_paragraph:
-                p = doc.add_paragraph()
-                p.add_run(''.join(current_paragraph)).font.name = 'Microsoft YaHei'
-            
-            # 保存文档
-            doc.save(file_path)
+        """Export the conversation to Word, Markdown or JSONL in the background"""
+        # 从结构化记录导出，而不是解析控件文本；先复制一份，避免导出途中被流式输出修改
+        records = [dict(entry) for entry in self.session.transcript.messages()]
+        if not records:
+            messagebox.showinfo("Info", "No chat content to download.")
+            return
+        
+        # 获取保存文件的路径
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".docx",
+            filetypes=[
+                ("Word Document", "*.docx"),
+                ("Markdown", "*.md"),
+                ("JSON Lines", "*.jsonl")
+            ],
+            title="Save Chat As"
+        )
+        
+        if not file_path:  # 如果用户取消了保存对话框
+            return
+        
+        self.download_btn.config(state=tk.DISABLED)
+        self.loading_label.config(text="正在导出聊天记录...")
+        self.loading_label.pack()
+        
+        def progress(done, total):
+            self.root.after(0, lambda: self.loading_label.config(text=f"正在导出聊天记录：{done}/{total} 条"))
+        
+        future = self.thread_pool.submit(export_transcript, records, file_path, progress)
+        future.add_done_callback(lambda f: self.root.after(0, self.on_export_done, f))
+        
+    def on_export_done(self, future):
+        self.download_btn.config(state=tk.NORMAL)
+        self.loading_label.pack_forget()
+        self.loading_label.config(text="加载中，请耐心等待loading...")
+        if future.exception() is not None:
+            logging.error(f"Export failed: {future.exception()}")
+            messagebox.showerror("Error", f"An error occurred while saving: {future.exception()}")
+        else:
             messagebox.showinfo("Success", "Chat history has been saved successfully!")
             
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred while saving: {str(e)}")
-            
     def check_and_create_env(self):
         if not os.path.exists('.env'):
             with open('.env', 'w') as f:
@@ -585,6 +1475,15 @@ class ChatbotGUI:
             logging.error(f'An error occurred: {e}')
             messagebox.showerror('Error', 'An unexpected error occurred. Please check the logs for details.')
             self.root.destroy()
+        finally:
+            try:
+                self.engine.submit(self.api_client.aclose()).result(2)
+            except Exception:
+                pass
+            self.api_client.close()
+            self.engine.stop()
+            self.store.close()
+            self.request_metrics.close()
 
 def get_api_key():
     with open('config.txt', 'r') as file:
@@ -593,6 +1492,13 @@ def get_api_key():
     return api_key
 
 if __name__ == "__main__":
+    # PyInstaller单文件打包下，解析子进程需要freeze_support
+    multiprocessing.freeze_support()
+    setup_logging(
+        Config.data_path('log.jsonl'),
+        level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+        redact=os.getenv('LOG_REDACT', '1') != '0',
+    )
     try:
         app = ChatbotGUI()
         app.run()
@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('config.txt', '.'), ('.env', '.')],  # Include data files
-    hiddenimports=['docx', 'PyPDF2', 'openai', 'pywin32', 'pywin32_ctypes'],  # Add hidden imports
+    hiddenimports=['docx', 'PyPDF2', 'openai', 'h2', 'pywin32', 'pywin32_ctypes'],  # Add hidden imports
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -1,6 +1,15 @@
 import os
 from dotenv import load_dotenv
 
+# 界面模式与模型的对应关系
+MODE_MODELS = {
+    "Chat": "deepseek-chat",
+    "Reasoner": "deepseek-reasoner",
+}
+
+# 本地数据目录（缓存、索引、会话记录等）
+DATA_DIR = os.path.join(os.path.expanduser('~'), '.chatWithDs')
+
 class Config:
     @staticmethod
     def check_and_create_env():
@@ -12,3 +21,8 @@ class Config:
     def get_api_key():
         load_dotenv()
         return os.getenv("DEEPSEEK_API_KEY")
+
+    @staticmethod
+    def data_path(name):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        return os.path.join(DATA_DIR, name)
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+
+class AsyncEngine:
+    """A single long-lived asyncio event loop running on a background thread.
+
+    Tk code submits coroutines with ``submit`` and gets back a
+    ``concurrent.futures.Future``; everything network related (the async
+    client and its connection pool) lives on this one loop.
+    """
+
+    def __init__(self, name="AsyncEngine"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def start(self):
+        if not self._thread.is_alive():
+            self._thread.start()
+        return self
+
+    @property
+    def running(self):
+        return self._thread.is_alive() and self.loop.is_running()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the engine loop (thread-safe)"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, callback, *args):
+        """Run a plain callback on the engine loop (thread-safe)"""
+        return self.loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self, timeout=2.0):
+        """Cancel outstanding tasks and stop the loop"""
+        if not self._thread.is_alive():
+            return
+
+        async def _shutdown():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            self.submit(_shutdown()).result(timeout)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
@@ -0,0 +1,94 @@
+import json
+import os
+
+SPEAKERS = {"user": "You", "assistant": "Assistant"}
+PROGRESS_EVERY = 200  # 每写出多少条记录报告一次进度
+WRITE_CHUNK = 1 << 16  # 文本格式每累积多少字符写一次磁盘
+
+
+def _report(progress, done, total):
+    if progress and (done % PROGRESS_EVERY == 0 or done == total):
+        progress(done, total)
+
+
+def _write_text(records, path, render, progress=None):
+    """Render records to a temp file in chunks, then move it into place"""
+    total = len(records)
+    tmp_path = path + ".part"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            buffer, size = [], 0
+            for done, record in enumerate(records, 1):
+                text = render(record)
+                buffer.append(text)
+                size += len(text)
+                if size >= WRITE_CHUNK:
+                    file.write("".join(buffer))
+                    buffer, size = [], 0
+                _report(progress, done, total)
+            file.write("".join(buffer))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _markdown(record):
+    speaker = SPEAKERS.get(record["role"], record["role"])
+    return f"**{speaker}:**\n\n{record['content']}\n\n"
+
+
+def _jsonl(record):
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def export_markdown(records, path, progress=None):
+    _write_text(records, path, _markdown, progress)
+
+
+def export_jsonl(records, path, progress=None):
+    _write_text(records, path, _jsonl, progress)
+
+
+def export_docx(records, path, progress=None):
+    """Word export; python-docx keeps the document in memory until it is saved"""
+    from docx import Document
+
+    doc = Document()
+    doc.styles['Normal'].font.name = 'Microsoft YaHei'
+    heading = doc.add_heading('Chat History', 0)
+    heading.style.font.name = 'Microsoft YaHei'
+    total = len(records)
+    for done, record in enumerate(records, 1):
+        speaker = SPEAKERS.get(record["role"], record["role"])
+        run = doc.add_paragraph().add_run(f"{speaker}:")
+        run.bold = True
+        run.font.name = 'Microsoft YaHei'
+        # 发言人取自结构化记录，内容中以"You:"开头的行不会被误判
+        doc.add_paragraph().add_run(record["content"]).font.name = 'Microsoft YaHei'
+        _report(progress, done, total)
+    tmp_path = path + ".part"
+    try:
+        doc.save(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+EXPORTERS = {
+    '.docx': export_docx,
+    '.md': export_markdown,
+    '.jsonl': export_jsonl,
+}
+
+
+def export_transcript(records, path, progress=None):
+    """Write message records ({"role", "content", ...}) in the format given by the file extension.
+
+    ``progress(done, total)`` is called periodically; meant to run in a worker thread.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in EXPORTERS:
+        raise ValueError(f"Unsupported export format: {ext}")
+    EXPORTERS[ext](records, path, progress)
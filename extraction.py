@@ -0,0 +1,146 @@
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+# python-docx 和 PyPDF2 在首次解析时才导入，避免拖慢启动
+PAGES_PER_TASK = 16  # 每个子进程任务处理的页数
+PARALLEL_MIN_PAGES = 64  # 页数少于此值时直接在当前进程解析（约2.6ms/页，更小的文件抵不过启动进程池的开销）
+
+
+class ExtractionCancelled(Exception):
+    """Raised when a cancel event is set while extracting"""
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+_worker_reader = None  # 子进程内缓存 ((路径, 修改时间), PdfReader)，同一文件的后续任务不再重新解析
+
+
+def _extract_page_range(file_path, start, stop):
+    """Worker: extract pages [start, stop) of a PDF (runs in a child process)"""
+    global _worker_reader
+    from PyPDF2 import PdfReader
+
+    key = (file_path, os.path.getmtime(file_path))
+    if _worker_reader is None or _worker_reader[0] != key:
+        _worker_reader = (key, PdfReader(file_path))
+    reader = _worker_reader[1]
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _get_pool(workers):
+    """The shared extraction pool, (re)created when the worker count changes"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool():
+    """Stop the shared extraction processes (registered with atexit)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown_pool)
+
+
+def iter_pdf_pages(file_path, progress=None, cancel_event=None, max_workers=None):
+    """Yield the text of each PDF page in order.
+
+    Large files are split into page ranges extracted across a process pool
+    (PyPDF2 is CPU bound, so threads would serialize on the GIL). The pool is
+    shared between calls and each worker keeps the parsed file, so a file is
+    parsed once per worker rather than once per page range. ``progress``
+    is called as ``progress(done, total)``; setting ``cancel_event`` aborts
+    with ExtractionCancelled.
+    """
+    from PyPDF2 import PdfReader
+
+    with open(file_path, 'rb') as file:
+        total = len(PdfReader(file).pages)
+
+    def check_cancel():
+        if cancel_event is not None and cancel_event.is_set():
+            raise ExtractionCancelled(file_path)
+
+    workers = max_workers or min(os.cpu_count() or 1, 8)
+    if total < PARALLEL_MIN_PAGES or workers < 2:
+        reader = PdfReader(file_path)
+        for i, page in enumerate(reader.pages):
+            check_cancel()
+            yield page.extract_text() or ""
+            if progress:
+                progress(i + 1, total)
+        return
+
+    pool = _get_pool(workers)
+    futures = [
+        pool.submit(_extract_page_range, file_path, start, min(start + PAGES_PER_TASK, total))
+        for start in range(0, total, PAGES_PER_TASK)
+    ]
+    done = 0
+    try:
+        for future in futures:
+            while True:
+                check_cancel()
+                try:
+                    texts = future.result(timeout=0.1)
+                    break
+                except FutureTimeout:
+                    continue
+                except BrokenProcessPool:
+                    shutdown_pool()  # 子进程异常退出，下次调用重建进程池
+                    raise
+            yield from texts
+            done += len(texts)
+            if progress:
+                progress(done, total)
+    finally:
+        # 进程池是共享的：只取消本次尚未开始的任务
+        for future in futures:
+            future.cancel()
+
+
+def extract_pdf(file_path, progress=None, cancel_event=None):
+    return "\n".join(iter_pdf_pages(file_path, progress, cancel_event))
+
+
+def extract_docx(file_path):
+    """Extract paragraphs and tables of a Word document in document order"""
+    from docx import Document
+    from docx.oxml.ns import qn
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    doc = Document(file_path)
+    parts = []
+    for child in doc.element.body.iterchildren():
+        if child.tag == qn('w:p'):
+            parts.append(Paragraph(child, doc).text)
+        elif child.tag == qn('w:tbl'):
+            for row in Table(child, doc).rows:
+                cells, seen = [], set()
+                for cell in row.cells:
+                    # 合并单元格会重复返回同一个单元格
+                    if id(cell._tc) in seen:
+                        continue
+                    seen.add(id(cell._tc))
+                    cells.append(cell.text)
+                parts.append("\t".join(cells))
+    return "\n".join(parts)
+
+
+def extract_txt(file_path):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return file.read()
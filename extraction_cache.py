@@ -0,0 +1,124 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from config import Config
+
+# 提取逻辑变化时递增，使旧缓存失效
+EXTRACTION_VERSION = 1
+
+
+def file_digest(file_path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Persistent cache of extracted document text keyed on file content hash.
+
+    A path+size+mtime table lets unchanged files skip hashing entirely; text
+    is stored zlib-compressed and evicted least-recently-used past max_bytes.
+    """
+
+    def __init__(self, path=None, max_bytes=256 * 1024 * 1024):
+        self.path = path or Config.data_path('extracted.sqlite3')
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                digest TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS texts (
+                digest TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS texts_accessed ON texts(accessed);
+        ''')
+
+    def digest_for(self, file_path):
+        """Content digest of file_path, skipping the hash when size and mtime are unchanged"""
+        stat = os.stat(file_path)
+        path = os.path.abspath(file_path)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime, digest FROM files WHERE path = ?', (path,)
+            ).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+        digest = f"{EXTRACTION_VERSION}:{file_digest(file_path)}"
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                (path, stat.st_size, stat.st_mtime, digest)
+            )
+            self._conn.commit()
+        return digest
+
+    def get(self, digest):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM texts WHERE digest = ?', (digest,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                'UPDATE texts SET accessed = ? WHERE digest = ?', (time.time(), digest)
+            )
+            self._conn.commit()
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def put(self, digest, text):
+        data = zlib.compress(text.encode('utf-8'), 6)
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO texts VALUES (?, ?, ?, ?)',
+                (digest, data, len(data), time.time())
+            )
+            self._conn.commit()
+        self.evict()
+
+    def get_or_extract(self, file_path, extract):
+        """Return cached text for file_path, calling extract(file_path) on a miss"""
+        digest = self.digest_for(file_path)
+        text = self.get(digest)
+        if text is None:
+            text = extract(file_path)
+            if text is not None:
+                self.put(digest, text)
+        return text
+
+    def evict(self):
+        """Drop least recently used texts until under max_bytes"""
+        with self._lock:
+            total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM texts').fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - int(self.max_bytes * 0.9)
+                for digest, size in self._conn.execute(
+                        'SELECT digest, size FROM texts ORDER BY accessed').fetchall():
+                    if excess <= 0:
+                        break
+                    self._conn.execute('DELETE FROM texts WHERE digest = ?', (digest,))
+                    excess -= size
+                self._conn.execute(
+                    'DELETE FROM files WHERE digest NOT IN (SELECT digest FROM texts)'
+                )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,199 @@
+import hashlib
+import os
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from extraction import ExtractionCancelled, extract_docx, extract_txt, iter_pdf_pages
+from tokens import estimate_tokens
+
+BLOCK_SEPARATOR = "\f"  # 缓存中分块文本的分隔符
+BLOCK_MIN_CHARS = 40  # 更短的块（标题、短行）不参与去重
+SHINGLE_CHARS = 5  # 按字符切分shingle，中英文通用
+SKETCH_SIZE = 64  # bottom-k 草图大小
+CANDIDATE_KEYS = 4  # 用草图中最小的几个哈希值做候选索引
+NEAR_DUP_THRESHOLD = 0.8  # 估计Jaccard相似度达到该值视为近似重复
+CORPUS_MAX_TOKENS = 400000
+
+_SPACE_RE = re.compile(r'\s+')
+
+
+def collect_files(paths, extensions):
+    """Expand directories recursively and keep files with an allowed extension, in a stable order"""
+    files, seen = [], set()
+    for path in paths:
+        if os.path.isdir(path):
+            found = []
+            for folder, dirs, names in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                found.extend(os.path.join(folder, name) for name in sorted(names))
+        else:
+            found = [path]
+        for file_path in found:
+            key = os.path.normcase(os.path.abspath(file_path))
+            if os.path.splitext(file_path)[1].lower() in extensions and key not in seen:
+                seen.add(key)
+                files.append(file_path)
+    return files
+
+
+def extract_blocks(file_path):
+    """Split a document into dedupe units: PDF pages, or paragraphs of Word/text files"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.pdf':
+        blocks = list(iter_pdf_pages(file_path, max_workers=1))
+    elif ext == '.docx':
+        blocks = extract_docx(file_path).split("\n")
+    else:
+        blocks = re.split(r'\n\s*\n', extract_txt(file_path))
+    return [b.strip().replace(BLOCK_SEPARATOR, " ") for b in blocks if b.strip()]
+
+
+def sketch(text):
+    """Bottom-k MinHash sketch of a block's character shingles (sorted tuple)"""
+    normalized = _SPACE_RE.sub(" ", text).lower()
+    shingles = {
+        zlib.crc32(normalized[i:i + SHINGLE_CHARS].encode('utf-8'))
+        for i in range(max(len(normalized) - SHINGLE_CHARS + 1, 1))
+    }
+    return tuple(sorted(shingles)[:SKETCH_SIZE])
+
+
+def similarity(a, b):
+    """Jaccard similarity estimated from two bottom-k sketches"""
+    union = sorted(set(a) | set(b))[:SKETCH_SIZE]
+    if not union:
+        return 1.0
+    both = set(a) & set(b)
+    return sum(1 for h in union if h in both) / len(union)
+
+
+def _prepare(file_path, blocks=None):
+    """Worker: extract blocks (unless cached) and sketch them (runs in a child process)"""
+    if blocks is None:
+        blocks = extract_blocks(file_path)
+    sketches = [sketch(b) if len(b) >= BLOCK_MIN_CHARS else None for b in blocks]
+    return blocks, sketches
+
+
+class Deduplicator:
+    """Remembers blocks seen so far and rejects exact and near duplicates"""
+
+    def __init__(self, threshold=NEAR_DUP_THRESHOLD):
+        self.threshold = threshold
+        self._exact = set()
+        self._candidates = {}  # 草图中的哈希值 -> 含该值的已保留草图
+
+    def add(self, block, block_sketch):
+        """True if the block is new and should be kept"""
+        if block_sketch is None:
+            return True
+        key = hashlib.blake2b(_SPACE_RE.sub(" ", block).lower().encode('utf-8'), digest_size=16).digest()
+        if key in self._exact:
+            return False
+        for value in block_sketch[:CANDIDATE_KEYS]:
+            for other in self._candidates.get(value, ()):
+                if similarity(block_sketch, other) >= self.threshold:
+                    return False
+        self._exact.add(key)
+        for value in block_sketch[:CANDIDATE_KEYS]:
+            self._candidates.setdefault(value, []).append(block_sketch)
+        return True
+
+
+def build_corpus(paths, extensions, cache=None, max_workers=None, progress=None,
+                 cancel_event=None, max_tokens=CORPUS_MAX_TOKENS):
+    """Extract many files in parallel and merge them into one deduplicated corpus.
+
+    Files are extracted across a process pool (block lists are reused from
+    ``cache``, an ExtractionCache, when possible). Identical files are skipped
+    by content digest before extraction; repeated or near-identical blocks
+    (boilerplate pages, copied sections) are dropped via shingle sketches.
+    The corpus stops growing at ``max_tokens``. Returns ``(text, stats)``.
+    """
+    files = collect_files(paths, extensions)
+    stats = {"files": len(files), "included": 0, "duplicate_files": 0,
+             "duplicate_blocks": 0, "failed": [], "truncated": 0, "tokens": 0}
+    if not files:
+        return "", stats
+
+    digests, seen_digests, unique = {}, set(), []
+    for file_path in files:
+        try:
+            digest = cache.digest_for(file_path) if cache is not None else None
+        except OSError as e:
+            # 无法读取或已被删除的文件只记为失败，不影响其余文件
+            stats["failed"].append(f"{os.path.basename(file_path)}: {e}")
+            continue
+        if digest is not None and digest in seen_digests:
+            stats["duplicate_files"] += 1  # 完全相同的文件无需解析
+            continue
+        digests[file_path] = digest
+        seen_digests.add(digest)
+        unique.append(file_path)
+
+    def check_cancel():
+        if cancel_event is not None and cancel_event.is_set():
+            raise ExtractionCancelled(paths)
+
+    pool = ProcessPoolExecutor(max_workers=max_workers or min(os.cpu_count() or 1, 8))
+    futures = {}
+    try:
+        for file_path in unique:
+            cached = None
+            if digests[file_path] is not None:
+                cached = cache.get(digests[file_path] + ":blocks")
+            blocks = cached.split(BLOCK_SEPARATOR) if cached else None
+            futures[file_path] = (pool.submit(_prepare, file_path, blocks), cached is None)
+
+        dedup = Deduplicator()
+        parts = []
+        full = False  # 已达到长度上限
+        for done, file_path in enumerate(unique, 1):
+            future, extracted = futures[file_path]
+            while True:
+                check_cancel()
+                try:
+                    blocks, sketches = future.result(timeout=0.1)
+                    break
+                except FutureTimeout:
+                    continue
+                except Exception as e:
+                    blocks = None
+                    stats["failed"].append(f"{os.path.basename(file_path)}: {e}")
+                    break
+            if progress:
+                progress(done, len(unique))
+            if blocks is None:
+                continue
+            if extracted and digests[file_path] is not None:
+                cache.put(digests[file_path] + ":blocks", BLOCK_SEPARATOR.join(blocks))
+            if full:
+                stats["truncated"] += 1
+                continue
+
+            header = f"【{os.path.basename(file_path)}】"
+            kept, tokens = [], estimate_tokens(header)
+            for block, block_sketch in zip(blocks, sketches):
+                if not dedup.add(block, block_sketch):
+                    stats["duplicate_blocks"] += 1
+                    continue
+                block_tokens = estimate_tokens(block)
+                if stats["tokens"] + tokens + block_tokens > max_tokens:
+                    full = True  # 超出上限，本文件余下部分及其后的文件不再加入
+                    break
+                kept.append(block)
+                tokens += block_tokens
+            if not kept:
+                # 部分导入的文件不计入未导入数
+                if full:
+                    stats["truncated"] += 1
+                else:
+                    stats["duplicate_files"] += 1
+                continue
+            parts.append(header + "\n" + "\n".join(kept))
+            stats["tokens"] += tokens
+            stats["included"] += 1
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return "\n\n".join(parts), stats
@@ -0,0 +1,385 @@
+import asyncio
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+METRICS_MAX_BYTES = 5 * 1024 * 1024  # JSONL指标文件上限，超出后轮转
+METRICS_BACKUPS = 2
+METRICS_QUEUE_SIZE = 10000  # 写入队列满时丢弃记录，绝不阻塞请求
+
+
+class CacheStats:
+    """Running totals of DeepSeek context-cache hit/miss prompt tokens"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hit_tokens = 0
+        self.miss_tokens = 0
+        self.last_hit_tokens = 0
+        self.last_miss_tokens = 0
+
+    def record(self, usage):
+        """Record the ``usage`` block of one completion"""
+        hit = getattr(usage, "prompt_cache_hit_tokens", None) or 0
+        miss = getattr(usage, "prompt_cache_miss_tokens", None)
+        if miss is None:
+            miss = max((getattr(usage, "prompt_tokens", 0) or 0) - hit, 0)
+        with self._lock:
+            self.requests += 1
+            self.hit_tokens += hit
+            self.miss_tokens += miss
+            self.last_hit_tokens = hit
+            self.last_miss_tokens = miss
+
+    @property
+    def hit_rate(self):
+        total = self.hit_tokens + self.miss_tokens
+        return self.hit_tokens / total if total else 0.0
+
+    def summary(self):
+        with self._lock:
+            return (f"缓存命中 {self.last_hit_tokens}/{self.last_hit_tokens + self.last_miss_tokens}"
+                    f" tokens，累计 {self.hit_rate:.0%}")
+
+
+class RollingPercentile:
+    """Percentiles over the most recent ``window`` samples"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, value):
+        with self._lock:
+            self._samples.append(value)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(p / 100.0 * (len(samples) - 1)))))
+        return samples[index]
+
+
+class HedgeStats:
+    """Counts of hedged (duplicate) requests"""
+
+    COUNTERS = ("fired", "won", "skipped")
+
+    def __init__(self):
+        self.fired = 0  # 发出的对冲请求数
+        self.won = 0  # 对冲请求先返回的次数
+        self.skipped = 0  # 因并发已满而放弃对冲的次数
+
+    def summary(self):
+        return f"对冲 {self.fired} 次，胜出 {self.won} 次，跳过 {self.skipped} 次"
+
+
+# 当前请求的计时记录，httpx的trace回调通过它把连接耗时归到对应请求
+CURRENT_SPAN = contextvars.ContextVar("request_span", default=None)
+
+
+class RequestSpan:
+    """Timing of one API request.
+
+    ``queue_wait`` is time spent waiting for a slot (``queued`` seconds
+    already spent in an upstream queue such as SessionScheduler, plus the
+    limiter), ``connect`` the
+    TCP+TLS setup of a new connection (0 when a pooled one was reused),
+    ``ttft`` the time from sending to the first response chunk,
+    ``time_to_answer`` to the first chunk of the answer itself (later than
+    ttft when a reasoner model thinks first) and ``total`` the wall time of
+    the whole call, retries and queueing included. A cancelled request
+    (e.g. the losing side of a hedge) is marked ``cancelled``, not failed.
+    """
+
+    def __init__(self, model, stream=False, queued=0.0):
+        self.model = model
+        self.stream = stream
+        self.timestamp = time.time() - queued
+        self.started = time.monotonic() - queued
+        self.sent = None
+        self.first_chunk = None
+        self.first_answer = None
+        self.finished = None
+        self.queue_wait = queued
+        self.connect = 0.0
+        self.attempts = 0
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.cache_hit_tokens = None
+        self.reasoning_tokens = None
+        self.error = None
+        self.cancelled = False
+        self._connect_started = None
+
+    def on_attempt(self, queue_wait):
+        """Called when an attempt got its limiter slot and is about to be sent"""
+        self.queue_wait += queue_wait
+        self.attempts += 1
+        self.sent = time.monotonic()
+
+    def on_first_chunk(self):
+        if self.first_chunk is None:
+            self.first_chunk = time.monotonic()
+
+    def on_first_answer(self):
+        if self.first_answer is None:
+            self.first_answer = time.monotonic()
+
+    def finish(self, usage=None, error=None):
+        self.finished = time.monotonic()
+        if error is None and not self.stream:
+            # 非流式请求：首个响应即完整响应
+            self.first_chunk = self.first_answer = self.finished
+        if usage is not None:
+            self.prompt_tokens = getattr(usage, "prompt_tokens", None)
+            self.completion_tokens = getattr(usage, "completion_tokens", None)
+            self.cache_hit_tokens = getattr(usage, "prompt_cache_hit_tokens", None)
+            details = getattr(usage, "completion_tokens_details", None)
+            self.reasoning_tokens = getattr(details, "reasoning_tokens", None)
+        if isinstance(error, asyncio.CancelledError):
+            self.cancelled = True
+        elif error is not None:
+            self.error = type(error).__name__
+
+    async def trace(self, event, info):
+        """httpcore ``trace`` extension: measures connection setup"""
+        if event.endswith("connect_tcp.started"):
+            self._connect_started = time.monotonic()
+        elif event.endswith(("connect_tcp.complete", "start_tls.complete")) and self._connect_started:
+            self.connect = time.monotonic() - self._connect_started
+
+    @property
+    def ttft(self):
+        if self.sent is None or self.first_chunk is None:
+            return None
+        return self.first_chunk - self.sent
+
+    @property
+    def time_to_answer(self):
+        if self.sent is None or self.first_answer is None:
+            return None
+        return self.first_answer - self.sent
+
+    @property
+    def total(self):
+        return None if self.finished is None else self.finished - self.started
+
+    @property
+    def tokens_per_second(self):
+        """Generation speed; for streams measured after the first chunk"""
+        if not self.completion_tokens or self.finished is None or self.sent is None:
+            return None
+        start = self.first_chunk if self.stream and self.first_chunk else self.sent
+        duration = self.finished - start
+        return self.completion_tokens / duration if duration > 0 else None
+
+    def as_dict(self):
+        def rounded(value):
+            return None if value is None else round(value, 4)
+        return {
+            "ts": round(self.timestamp, 3),
+            "model": self.model,
+            "stream": self.stream,
+            "attempts": self.attempts,
+            "queue_wait": rounded(self.queue_wait),
+            "connect": rounded(self.connect),
+            "ttft": rounded(self.ttft),
+            "time_to_answer": rounded(self.time_to_answer),
+            "total": rounded(self.total),
+            "tokens_per_second": rounded(self.tokens_per_second),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cache_hit_tokens": self.cache_hit_tokens,
+            "reasoning_tokens": self.reasoning_tokens,
+            "error": self.error,
+            "cancelled": self.cancelled,
+        }
+
+
+class RequestMetrics:
+    """Rolling percentiles and totals over finished RequestSpans.
+
+    With ``path`` every span is also written out: one JSON line per request,
+    or, for a ``.prom`` file, the current aggregates in Prometheus text format
+    (rewritten in place, as node_exporter's textfile collector expects).
+    Writes happen on a background thread, so ``record`` never touches the
+    disk; the JSONL file is rotated at ``max_bytes`` keeping ``backups``
+    old files. Call ``close`` to flush on exit.
+    """
+
+    FIELDS = ("queue_wait", "connect", "ttft", "time_to_answer", "total", "tokens_per_second")
+    LABELS = {
+        "queue_wait": "排队",
+        "connect": "建连",
+        "ttft": "首字",
+        "time_to_answer": "出答案",
+        "total": "总耗时",
+        "tokens_per_second": "生成速度",
+    }
+
+    def __init__(self, window=500, path=None, max_bytes=METRICS_MAX_BYTES, backups=METRICS_BACKUPS):
+        self.path = path
+        self.prometheus = bool(path) and path.endswith(".prom")
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self.rolling = {field: RollingPercentile(window) for field in self.FIELDS}
+        self.requests = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.hedges = HedgeStats()  # 由APIClient在对冲时更新
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cache_hit_tokens = 0
+        self.reasoning_tokens = 0
+        self.last = None
+        self._queue = None
+        if path:
+            self._queue = queue.Queue(METRICS_QUEUE_SIZE)
+            self._writer = threading.Thread(target=self._write_loop, name="RequestMetrics", daemon=True)
+            self._writer.start()
+
+    def record(self, span):
+        record = span.as_dict()
+        with self._lock:
+            self.requests += 1
+            self.last = record
+            if record["cancelled"]:
+                self.cancelled += 1  # 被取消（如对冲落败）不算失败，也不计入分位数
+            elif record["error"] is not None:
+                self.errors += 1
+            else:
+                for field in self.FIELDS:
+                    if record[field] is not None:
+                        self.rolling[field].add(record[field])
+            self.prompt_tokens += record["prompt_tokens"] or 0
+            self.completion_tokens += record["completion_tokens"] or 0
+            self.cache_hit_tokens += record["cache_hit_tokens"] or 0
+            self.reasoning_tokens += record["reasoning_tokens"] or 0
+        write_queue = self._queue
+        if write_queue is not None:
+            try:
+                write_queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+
+    def _write_loop(self):
+        while True:
+            # 一次取完已排队的记录：JSONL批量追加，.prom只重写一次
+            batch = [self._queue.get()]
+            while batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            try:
+                self._write([record for record in batch if record is not None])
+            except OSError:
+                pass  # 指标文件写失败不影响请求
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, records):
+        if not records:
+            return
+        if self.prometheus:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                file.write(self.prometheus_text())
+            os.replace(tmp_path, self.path)
+            return
+        data = "".join(json.dumps(record) + "\n" for record in records)
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size and size + len(data.encode('utf-8')) > self.max_bytes:
+            self._rotate()
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write(data)
+
+    def _rotate(self):
+        """metrics.jsonl -> metrics.jsonl.1 -> ... -> metrics.jsonl.<backups>, dropping the oldest"""
+        if self.backups < 1:
+            os.remove(self.path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, self.path + ".1")
+
+    def flush(self, timeout=5.0):
+        """Wait until every span recorded so far has been written"""
+        deadline = time.monotonic() + timeout
+        while self._queue is not None and self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self):
+        """Write what is still queued and stop the writer thread"""
+        if self._queue is None:
+            return
+        self._queue.put(None)
+        self._writer.join(5.0)
+        self._queue = None
+
+    def percentile(self, field, p):
+        return self.rolling[field].percentile(p)
+
+    def prometheus_text(self):
+        lines = []
+        for field in self.FIELDS:
+            name = f"chatwithds_request_{field}" + ("" if field == "tokens_per_second" else "_seconds")
+            lines.append(f"# TYPE {name} summary")
+            for q in (0.5, 0.9, 0.99):
+                value = self.percentile(field, q * 100)
+                if value is not None:
+                    lines.append(f'{name}{{quantile="{q}"}} {value}')
+            lines.append(f"{name}_count {len(self.rolling[field])}")
+        with self._lock:
+            counters = {
+                "requests": self.requests,
+                "errors": self.errors,
+                "cancelled": self.cancelled,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cache_hit_tokens": self.cache_hit_tokens,
+                "reasoning_tokens": self.reasoning_tokens,
+            }
+        for name in HedgeStats.COUNTERS:
+            counters[f"hedges_{name}"] = getattr(self.hedges, name)
+        for name, value in counters.items():
+            lines.append(f"# TYPE chatwithds_{name}_total counter")
+            lines.append(f"chatwithds_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Multi-line text for the stats panel"""
+        lines = [f"请求 {self.requests} 次，失败 {self.errors} 次，取消 {self.cancelled} 次，"
+                 f"tokens 输入 {self.prompt_tokens} / 输出 {self.completion_tokens}"
+                 f"（其中思考 {self.reasoning_tokens}） / 缓存命中 {self.cache_hit_tokens}"]
+        if self.hedges.fired or self.hedges.skipped:
+            lines.append(self.hedges.summary())
+        for field in self.FIELDS:
+            p50, p95 = self.percentile(field, 50), self.percentile(field, 95)
+            if p50 is None:
+                continue
+            unit = " tok/s" if field == "tokens_per_second" else "s"
+            lines.append(f"{self.LABELS[field]}  p50 {p50:.2f}{unit}  p95 {p95:.2f}{unit}")
+        return "\n".join(lines)
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Refilling budget of ``per_minute`` units; may go negative to record overdraft"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until ``amount`` can be consumed (0 if available now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self.tokens -= amount
+
+
+def status_of(error):
+    return getattr(error, "status_code", None)
+
+
+def retry_after_seconds(error):
+    """Parse a Retry-After header (seconds) from an API error, if present"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable(error):
+    import openai  # 出错时openai必然已加载，这里不增加启动开销
+
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return status_of(error) in RETRYABLE_STATUS
+
+
+class AdaptiveLimiter:
+    """Requests-per-minute and tokens-per-minute budgets plus an AIMD concurrency limit.
+
+    Concurrency grows additively on success and is halved on 429/5xx (with a
+    global pause honouring Retry-After); a rising time-to-first-byte relative
+    to the observed baseline (measured on streamed calls) also backs it off
+    gently. Must be used from a single event loop.
+    """
+
+    def __init__(self, rpm=300, tpm=2_000_000, initial_concurrency=3,
+                 min_concurrency=1, max_concurrency=12, latency_factor=2.0,
+                 max_attempts=4, base_delay=0.5, max_delay=30.0):
+        self.requests = TokenBucket(rpm, capacity=max(rpm // 10, 1))
+        self.tokens = TokenBucket(tpm, capacity=max(tpm // 4, 1))
+        self.limit = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_factor = latency_factor
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self.baseline_latency = None
+        self._paused_until = 0.0
+        self._cond = asyncio.Condition()
+
+    @property
+    def concurrency(self):
+        return max(int(self.limit), self.min_concurrency)
+
+    async def acquire(self, tokens=0):
+        """Wait for a concurrency slot and budget; returns seconds spent queued"""
+        started = time.monotonic()
+        async with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.in_flight >= self.concurrency:
+                    wait = None
+                else:
+                    wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                    if wait == 0:
+                        self.requests.consume(1)
+                        self.tokens.consume(tokens)
+                        self.in_flight += 1
+                        return time.monotonic() - started
+                if wait is None:
+                    await self._cond.wait()
+                else:
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+
+    async def release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, tokens=0):
+        await self.acquire(tokens)
+        try:
+            yield self
+        finally:
+            await self.release()
+
+    def record_usage(self, estimated, actual):
+        """Charge the difference between estimated and actual tokens"""
+        if actual is not None:
+            self.tokens.consume(actual - estimated)
+
+    def on_success(self, latency=None):
+        """Grow the limit; ``latency`` (time to response headers) also feeds the slow-down check.
+
+        Only streamed calls pass a latency: a non-streamed call's duration
+        grows with the reply length, so it says nothing about server load.
+        """
+        if latency is not None:
+            if self.baseline_latency is None:
+                self.baseline_latency = latency
+            else:
+                self.baseline_latency = min(latency, 0.9 * self.baseline_latency + 0.1 * latency)
+            if latency > self.latency_factor * self.baseline_latency:
+                self.limit = max(self.min_concurrency, self.limit * 0.9)
+                return
+        self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+
+    def on_throttle(self, retry_after=None):
+        self.limit = max(self.min_concurrency, self.limit / 2)
+        if retry_after:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def backoff(self, error, attempt):
+        """Delay before retrying after ``error`` on zero-based ``attempt``; None if it should not be retried"""
+        retry_after = retry_after_seconds(error)
+        # 无论是否重试，服务端过载信号都要降低并发
+        if status_of(error) == 429 or (status_of(error) or 0) >= 500:
+            self.on_throttle(retry_after)
+        if not is_retryable(error) or attempt + 1 >= self.max_attempts:
+            return None
+        if retry_after is not None:
+            return retry_after
+        # 指数退避 + 全抖动
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+async def call_with_retry(limiter, call, tokens=0, span=None):
+    """Await ``call()`` inside a limiter slot, retrying transient failures with backoff.
+
+    ``span`` (a metrics.RequestSpan) is told about every attempt and its queue wait.
+    Success is reported without a latency (see ``AdaptiveLimiter.on_success``).
+    """
+    attempt = 0
+    while True:
+        waited = await limiter.acquire(tokens)
+        if span is not None:
+            span.on_attempt(waited)
+        try:
+            result = await call()
+            limiter.on_success()
+            return result
+        except Exception as e:
+            delay = limiter.backoff(e, attempt)
+            if delay is None:
+                raise
+            logging.warning(f"API call failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+        finally:
+            await limiter.release()
+        attempt += 1
+        await asyncio.sleep(delay)
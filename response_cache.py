@@ -0,0 +1,104 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from config import Config
+
+
+class ResponseCache:
+    """Single-file SQLite cache of completed replies with size/age based LRU eviction.
+
+    Keys are a hash of the model, the normalized message list and the
+    sampling parameters, so only byte-for-byte equivalent requests hit.
+    """
+
+    def __init__(self, path=None, max_bytes=64 * 1024 * 1024,
+                 max_age=30 * 24 * 3600):
+        self.path = path or Config.data_path('responses.sqlite3')
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                reply TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed);
+        ''')
+        self.evict()
+
+    @staticmethod
+    def make_key(model, messages, **params):
+        """Stable hash of a request; whitespace-only differences do not matter"""
+        normalized = [
+            {"role": m["role"],
+             "content": "\n".join(line.rstrip() for line in (m.get("content") or "").strip().splitlines())}
+            for m in messages
+        ]
+        payload = json.dumps(
+            {"model": model, "messages": normalized, "params": params},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT reply, created FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.max_age:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key, model, reply):
+        now = time.time()
+        size = len(reply.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                (key, model, reply, size, now, now)
+            )
+            self._conn.commit()
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        with self._lock:
+            self._conn.execute(
+                'DELETE FROM responses WHERE created < ?', (time.time() - self.max_age,)
+            )
+            total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - int(self.max_bytes * 0.9)
+                for key, size in self._conn.execute(
+                        'SELECT key, size FROM responses ORDER BY accessed').fetchall():
+                    if excess <= 0:
+                        break
+                    self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                    excess -= size
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
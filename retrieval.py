@@ -0,0 +1,140 @@
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+from config import Config
+from tokens import split_by_tokens
+
+CHUNK_TOKENS = 400  # 每个检索片段的大致token数
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORD_RE = re.compile(r'[a-z0-9_]+|[\u3400-\u4dbf\u4e00-\u9fff]+')
+_CJK_START = '\u3400'
+
+
+def tokenize(text):
+    """Lowercased latin words plus CJK character bigrams"""
+    terms = []
+    for match in _WORD_RE.findall(text.lower()):
+        if match[0] >= _CJK_START:
+            if len(match) == 1:
+                terms.append(match)
+            else:
+                terms.extend(match[i:i + 2] for i in range(len(match) - 1))
+        else:
+            terms.append(match)
+    return terms
+
+
+class DocumentIndex:
+    """Persistent BM25 inverted index over uploaded document chunks (SQLite)"""
+
+    def __init__(self, path=None):
+        self.path = path or Config.data_path('documents.sqlite3')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                digest TEXT UNIQUE NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                doc_id INTEGER NOT NULL,
+                ord INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                chunk_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS postings_term ON postings(term);
+            CREATE INDEX IF NOT EXISTS chunks_doc ON chunks(doc_id);
+        ''')
+
+    def add_document(self, name, text, digest):
+        """Chunk and index a document; returns (doc_id, chunk_count). Re-adding the same digest is free."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id FROM documents WHERE digest = ?', (digest,)
+            ).fetchone()
+            if row is not None:
+                count = self._conn.execute(
+                    'SELECT COUNT(*) FROM chunks WHERE doc_id = ?', (row[0],)
+                ).fetchone()[0]
+                return row[0], count
+        chunks = [c for c in split_by_tokens(text, CHUNK_TOKENS) if c.strip()]
+        prepared = [(chunk, Counter(tokenize(chunk))) for chunk in chunks]
+        with self._lock:
+            cur = self._conn.execute(
+                'INSERT INTO documents (name, digest) VALUES (?, ?)', (name, digest)
+            )
+            doc_id = cur.lastrowid
+            for ord_, (chunk, counts) in enumerate(prepared):
+                cur = self._conn.execute(
+                    'INSERT INTO chunks (doc_id, ord, text, length) VALUES (?, ?, ?, ?)',
+                    (doc_id, ord_, chunk, sum(counts.values()))
+                )
+                chunk_id = cur.lastrowid
+                self._conn.executemany(
+                    'INSERT INTO postings VALUES (?, ?, ?)',
+                    [(term, chunk_id, tf) for term, tf in counts.items()]
+                )
+            self._conn.commit()
+        return doc_id, len(prepared)
+
+    def search(self, query, k=5, doc_ids=None):
+        """Top-k chunks for query as (score, doc_name, text), best first"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            total, avgdl = self._conn.execute(
+                'SELECT COUNT(*), AVG(length) FROM chunks'
+            ).fetchone()
+            if not total:
+                return []
+            avgdl = avgdl or 1
+            scores = Counter()
+            for term in terms:
+                rows = self._conn.execute(
+                    'SELECT p.chunk_id, p.tf, c.length, c.doc_id FROM postings p '
+                    'JOIN chunks c ON c.id = p.chunk_id WHERE p.term = ?', (term,)
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (total - len(rows) + 0.5) / (len(rows) + 0.5))
+                for chunk_id, tf, length, doc_id in rows:
+                    if doc_ids is not None and doc_id not in doc_ids:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avgdl)
+                    scores[chunk_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+            results = []
+            for chunk_id, score in scores.most_common(k):
+                name, text = self._conn.execute(
+                    'SELECT d.name, c.text FROM chunks c JOIN documents d ON d.id = c.doc_id '
+                    'WHERE c.id = ?', (chunk_id,)
+                ).fetchone()
+                results.append((score, name, text))
+        return results
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def format_context(results):
+    """Render retrieved chunks as a reference block prepended to the user's question"""
+    if not results:
+        return ""
+    parts = ["以下是从已上传文档中检索到的相关片段，请据此回答：\n"]
+    for i, (_, name, text) in enumerate(results, 1):
+        parts.append(f"[{i}] 《{name}》\n{text.strip()}\n")
+    parts.append("问题：")
+    return "\n".join(parts)
@@ -0,0 +1,129 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+
+
+class SessionScheduler:
+    """Shared admission control for chat turns from several sessions (tabs).
+
+    At most ``concurrency`` turns run at once (an int, or a callable such as
+    ``lambda: limiter.concurrency`` to follow the adaptive limit). When a slot
+    frees up the focused session goes first; otherwise the session with the
+    fewest running turns, then the one served longest ago, so a busy tab
+    cannot starve the others. Long jobs (reasoner turns) never take the last
+    ``reserved`` slots, which keeps quick chat turns moving. Turns of one
+    session start in submission order. Must be used from a single event loop.
+    """
+
+    def __init__(self, concurrency=3, reserved=1):
+        self._concurrency = concurrency
+        self.reserved = reserved
+        self.focused = None  # 当前标签页的会话，可从Tk线程直接赋值
+        self.running = {}  # session -> 进行中的轮次数
+        self.long_running = 0
+        self._waiting = {}  # session -> deque of (future, long)
+        self._served = {}  # session -> 上次获得名额时的序号
+        self._clock = itertools.count()
+
+    @property
+    def concurrency(self):
+        value = self._concurrency() if callable(self._concurrency) else self._concurrency
+        return max(int(value), 1)
+
+    @property
+    def in_flight(self):
+        return sum(list(self.running.values()))
+
+    def waiting(self, session=None):
+        """Number of queued turns, for one session or all of them"""
+        if session is not None:
+            return len(self._waiting.get(session, ()))
+        return sum(len(queue) for queue in list(self._waiting.values()))
+
+    def focus(self, session):
+        self.focused = session
+
+    def _admissible(self, long):
+        return not long or self.long_running < max(self.concurrency - self.reserved, 1)
+
+    def _pick(self):
+        candidates = [s for s, queue in self._waiting.items() if self._admissible(queue[0][1])]
+        if not candidates:
+            return None
+        if self.focused in candidates:
+            return self.focused
+        return min(candidates, key=lambda s: (self.running.get(s, 0), self._served.get(s, -1)))
+
+    def _dispatch(self):
+        while self.in_flight < self.concurrency:
+            session = self._pick()
+            if session is None:
+                return
+            queue = self._waiting[session]
+            future, long = queue.popleft()
+            if not queue:
+                del self._waiting[session]
+            if future.done():
+                continue  # 排队时已被取消
+            self.running[session] = self.running.get(session, 0) + 1
+            if long:
+                self.long_running += 1
+            self._served[session] = next(self._clock)
+            future.set_result(None)
+
+    def _dequeue(self, session, entry):
+        queue = self._waiting.get(session)
+        if queue is not None and entry in queue:
+            queue.remove(entry)
+            if not queue:
+                del self._waiting[session]
+
+    async def acquire(self, session, long=False):
+        """Wait for a slot for ``session``; returns seconds spent queued"""
+        started = time.monotonic()
+        entry = (asyncio.get_running_loop().create_future(), long)
+        self._waiting.setdefault(session, deque()).append(entry)
+        self._dispatch()
+        try:
+            await entry[0]
+        except asyncio.CancelledError:
+            if entry[0].done() and not entry[0].cancelled():
+                self.release(session, long)  # 名额已分配但任务在恢复前被取消
+            else:
+                self._dequeue(session, entry)
+            raise
+        return time.monotonic() - started
+
+    def release(self, session, long=False):
+        self.running[session] -= 1
+        if not self.running[session]:
+            del self.running[session]
+        if long:
+            self.long_running -= 1
+        self._dispatch()
+
+    def slot(self, session, long=False):
+        """Context manager holding one slot per entry; reusable, e.g. as the ``semaphore`` of a fan-out job.
+
+        ``async with scheduler.slot(session) as queued`` gives the seconds spent waiting.
+        """
+        return SessionSlot(self, session, long)
+
+    def summary(self):
+        return f"会话调度：进行中 {self.in_flight}/{self.concurrency}，排队 {self.waiting()}"
+
+
+class SessionSlot:
+    """Async context manager taking one scheduler slot per entry (reusable, also concurrently)"""
+
+    def __init__(self, scheduler, session, long=False):
+        self.scheduler = scheduler
+        self.session = session
+        self.long = long
+
+    async def __aenter__(self):
+        return await self.scheduler.acquire(self.session, self.long)
+
+    async def __aexit__(self, *exc_info):
+        self.scheduler.release(self.session, self.long)
@@ -0,0 +1,202 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import Config
+
+WRITE_BATCH_SIZE = 200
+WRITE_BATCH_WAIT = 0.2  # 秒，攒批写入的最长等待时间
+
+
+class ConversationStore:
+    """Append-only SQLite (WAL) store of every chat message, with FTS5 search.
+
+    Writes are queued and committed in batches by a background thread, so
+    the UI never waits on disk; reads use their own connection and are paged,
+    so opening the app costs the same no matter how large the store is.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Config.data_path('conversations.sqlite3')
+        self._queue = queue.Queue()
+        self._read_lock = threading.Lock()
+        self._read = self._connect()
+        self._init_schema(self._read)
+        self._writer = threading.Thread(target=self._write_loop, name="ConversationStore", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_schema(self, conn):
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated);
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                model TEXT,
+                created REAL NOT NULL,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                cache_hit_tokens INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS messages_session ON messages(session_id, id);
+        ''')
+        try:
+            # trigram分词支持中文子串搜索（SQLite 3.34+）
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+                         "content, content='messages', content_rowid='id', tokenize='trigram')")
+        except sqlite3.OperationalError:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+                         "content, content='messages', content_rowid='id')")
+        conn.commit()
+        sql = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'messages_fts'"
+        ).fetchone()[0]
+        self.trigram = 'trigram' in sql
+
+    @staticmethod
+    def new_session_id():
+        return uuid.uuid4().hex
+
+    def add_session(self, session_id, title):
+        now = time.time()
+        self._queue.put(('session', (session_id, title[:100], now, now)))
+
+    def add_message(self, session_id, role, content, model=None, usage=None):
+        """Queue a message for writing; never blocks on disk"""
+        prompt = completion = cache_hit = None
+        if usage is not None:
+            prompt = getattr(usage, 'prompt_tokens', None)
+            completion = getattr(usage, 'completion_tokens', None)
+            cache_hit = getattr(usage, 'prompt_cache_hit_tokens', None)
+        # 回复可能为None（如只有思考过程），content列不允许为空
+        self._queue.put(('message', (session_id, role, content or "", model, time.time(),
+                                     prompt, completion, cache_hit)))
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            deadline = time.monotonic() + WRITE_BATCH_WAIT
+            while len(batch) < WRITE_BATCH_SIZE and batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            try:
+                self._write_rows(conn, [b for b in batch if b is not None])
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def _write_rows(self, conn, batch):
+        """Write a batch in one transaction; if it fails, row by row so only bad rows are lost"""
+        try:
+            self._write_batch(conn, batch)
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                logging.error(f"Conversation store write failed: {e}")
+                return
+        for item in batch:
+            try:
+                self._write_batch(conn, [item])
+            except Exception as e:
+                logging.error(f"Conversation store write failed: {e}")
+
+    def _write_batch(self, conn, batch):
+        with conn:
+            for kind, row in batch:
+                if kind == 'session':
+                    conn.execute('INSERT OR IGNORE INTO sessions VALUES (?, ?, ?, ?)', row)
+                else:
+                    cur = conn.execute(
+                        'INSERT INTO messages (session_id, role, content, model, created, '
+                        'prompt_tokens, completion_tokens, cache_hit_tokens) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', row
+                    )
+                    conn.execute('INSERT INTO messages_fts (rowid, content) VALUES (?, ?)',
+                                 (cur.lastrowid, row[2]))
+                    conn.execute('UPDATE sessions SET updated = ? WHERE id = ?', (row[4], row[0]))
+
+    def flush(self, timeout=5.0):
+        """Wait until everything queued so far has been written"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def list_sessions(self, limit=50, offset=0):
+        """Most recently updated sessions as (id, title, updated)"""
+        with self._read_lock:
+            return self._read.execute(
+                'SELECT id, title, updated FROM sessions ORDER BY updated DESC LIMIT ? OFFSET ?',
+                (limit, offset)
+            ).fetchall()
+
+    def load_messages(self, session_id, limit=200, before_id=None):
+        """One page of a session's messages, oldest first, as dicts"""
+        with self._read_lock:
+            rows = self._read.execute(
+                'SELECT id, role, content, model, created FROM messages '
+                'WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?',
+                (session_id, before_id if before_id is not None else 2 ** 62, limit)
+            ).fetchall()
+        return [
+            {"id": r[0], "role": r[1], "content": r[2], "model": r[3], "created": r[4]}
+            for r in reversed(rows)
+        ]
+
+    def search(self, query, limit=50):
+        """Full-text search; returns (session_id, title, message_id, role, snippet), best match first"""
+        query = query.strip()
+        if not query:
+            return []
+        with self._read_lock:
+            if len(query) >= 3 or not self.trigram:
+                fts_query = '"' + query.replace('"', '""') + '"'
+                try:
+                    results = self._read.execute(
+                        "SELECT m.session_id, s.title, m.id, m.role, "
+                        "snippet(messages_fts, 0, '[', ']', '…', 16) "
+                        "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                        "JOIN sessions s ON s.id = m.session_id "
+                        "WHERE messages_fts MATCH ? ORDER BY rank LIMIT ?",
+                        (fts_query, limit)
+                    ).fetchall()
+                    if results or self.trigram:
+                        return results
+                except sqlite3.OperationalError:
+                    pass
+            # 过短的查询无法使用trigram索引（或无trigram分词时的中文查询），退回LIKE扫描
+            return self._read.execute(
+                "SELECT m.session_id, s.title, m.id, m.role, substr(m.content, 1, 80) "
+                "FROM messages m JOIN sessions s ON s.id = m.session_id "
+                "WHERE m.content LIKE ? ORDER BY m.id DESC LIMIT ?",
+                ('%' + query + '%', limit)
+            ).fetchall()
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join(5.0)
+        with self._read_lock:
+            self._read.close()
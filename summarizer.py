@@ -0,0 +1,78 @@
+import asyncio
+import contextlib
+
+from tokens import estimate_tokens, split_by_tokens
+
+MAP_CHUNK_TOKENS = 12000  # 每段原文的token数
+REDUCE_INPUT_TOKENS = 24000  # 单次合并调用可接受的摘要总量
+
+MAP_PROMPT = "请用中文简明总结以下文档片段的要点，保留关键数据、结论和专有名词：\n\n"
+REDUCE_PROMPT = "以下是同一文档各部分的摘要，请整合为一份结构清晰的完整总结：\n\n"
+MEMORY_PROMPT = ("请把下面的已有摘要与随后的对话合并为一份新的简明摘要，供后续对话作为背景使用。"
+                 "保留用户的目标、偏好、已确认的事实与结论、未解决的问题，以及重要的数字和名称；"
+                 "省略寒暄和重复内容，只输出摘要本身。\n\n")
+MEMORY_ROLES = {"user": "用户", "assistant": "助手"}
+
+
+async def _complete(api_client, model, prompt, semaphore):
+    async with semaphore or contextlib.nullcontext() as queued:
+        # 调度器名额返回排队秒数，计入请求计时；普通信号量返回None
+        response = await api_client.send_message_async(
+            [{"role": "user", "content": prompt}], model, queued=queued or 0.0
+        )
+    return response.choices[0].message.content or ""
+
+
+async def map_reduce_summarize(api_client, text, model, semaphore=None,
+                               progress=None, on_partial=None):
+    """Summarize text larger than the context window.
+
+    The text is split into token-sized chunks summarized concurrently (bounded
+    by the client's rate limiter, and by ``semaphore`` if given), then the
+    partial summaries are reduced, recursively if they still do not fit one
+    call. ``progress(done, total)`` and ``on_partial(index, summary)`` are
+    called as map calls finish.
+    """
+    chunks = split_by_tokens(text, MAP_CHUNK_TOKENS)
+    total = len(chunks)
+    done = 0
+
+    async def summarize_chunk(index, chunk):
+        nonlocal done
+        summary = await _complete(api_client, model, MAP_PROMPT + chunk, semaphore)
+        done += 1
+        if progress:
+            progress(done, total)
+        if on_partial:
+            on_partial(index, summary)
+        return summary
+
+    summaries = await asyncio.gather(
+        *(summarize_chunk(i, chunk) for i, chunk in enumerate(chunks))
+    )
+    if len(summaries) == 1:
+        return summaries[0]
+
+    # 摘要总量仍超出单次调用上限时，分组合并后再继续
+    while estimate_tokens("\n\n".join(summaries)) > REDUCE_INPUT_TOKENS:
+        groups = split_by_tokens("\n\n".join(summaries), REDUCE_INPUT_TOKENS)
+        if len(groups) <= 1:
+            break
+        summaries = await asyncio.gather(
+            *(_complete(api_client, model, REDUCE_PROMPT + group, semaphore) for group in groups)
+        )
+
+    joined = "\n\n".join(f"【第{i}部分】\n{s}" for i, s in enumerate(summaries, 1))
+    return await _complete(api_client, model, REDUCE_PROMPT + joined, semaphore)
+
+
+async def update_memory(api_client, model, memory, messages, semaphore=None):
+    """Fold ``messages`` into the running conversation summary ``memory``"""
+    transcript = "\n\n".join(
+        f"{MEMORY_ROLES.get(m['role'], m['role'])}：{m['content']}" for m in messages
+    )
+    prompt = MEMORY_PROMPT
+    if memory:
+        prompt += f"【已有摘要】\n{memory}\n\n"
+    prompt += f"【随后的对话】\n{transcript}"
+    return (await _complete(api_client, model, prompt, semaphore)).strip()
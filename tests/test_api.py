@@ -0,0 +1,107 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from api import APIClient
+
+class FakeStream:
+    def __init__(self, delay, tag):
+        self.delay = delay
+        self.tag = tag
+        self.closed = False
+
+    async def _chunks(self):
+        await asyncio.sleep(self.delay)
+        for i in range(3):
+            delta = SimpleNamespace(content=f'{self.tag}{i}')
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta)])
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def close(self):
+        self.closed = True
+
+class TestHedging(unittest.TestCase):
+    def collect(self, delays):
+        streams = []
+
+        async def create(**params):
+            stream = FakeStream(delays[len(streams)], 'AB'[len(streams)])
+            streams.append(stream)
+            return stream
+
+        async def main():
+            client = APIClient('test-key')
+            client.hedge_after = 0.05
+            client.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+            try:
+                chunks = [c.choices[0].delta.content async for c in client.stream_message(
+                    [{'role': 'user', 'content': 'hi'}], 'deepseek-chat', hedge=True)]
+            finally:
+                await client.aclose()
+                client.close()
+            return client, chunks
+
+        client, chunks = asyncio.run(main())
+        return client, chunks, streams
+
+    def test_slow_primary_is_hedged(self):
+        client, chunks, streams = self.collect([1.0, 0.0])
+        self.assertEqual(chunks, ['B0', 'B1', 'B2'])
+        self.assertEqual((client.hedge_stats.fired, client.hedge_stats.won), (1, 1))
+        self.assertEqual(client.limiter.in_flight, 0)
+        self.assertTrue(all(s.closed for s in streams))
+        # 落败的对冲请求记为取消而非失败，也不计入延迟分位数
+        self.assertEqual((client.metrics.requests, client.metrics.errors, client.metrics.cancelled), (2, 0, 1))
+        self.assertEqual(len(client.metrics.rolling['ttft']), 1)
+        self.assertIn('对冲 1 次，胜出 1 次', client.metrics.summary())
+        self.assertIn('chatwithds_hedges_won_total 1', client.metrics.prometheus_text())
+
+    def test_fast_primary_not_hedged(self):
+        client, chunks, streams = self.collect([0.0, 0.0])
+        self.assertEqual(chunks, ['A0', 'A1', 'A2'])
+        self.assertEqual(client.hedge_stats.fired, 0)
+        self.assertEqual(len(streams), 1)
+
+class TestHedgeCancellation(unittest.TestCase):
+    """Cancelling the caller while waiting for the hedge threshold must cancel the primary request"""
+
+    def run_cancelled(self, stream):
+        async def create(**params):
+            await asyncio.sleep(1.0)
+            return FakeStream(0, 'A') if stream else SimpleNamespace(usage=None)
+
+        async def main():
+            client = APIClient('test-key')
+            client.hedge_after = 0.5
+            client.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+            messages = [{'role': 'user', 'content': 'hi'}]
+
+            async def consume():
+                if stream:
+                    return [c async for c in client.stream_message(messages, 'deepseek-chat', hedge=True)]
+                return await client.send_message_async(messages, 'deepseek-chat', hedge=True)
+
+            task = asyncio.ensure_future(consume())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(client.limiter.in_flight, 0)
+            await asyncio.sleep(1.1)  # 被取消的请求不会在后台继续完成
+            client.close()
+            return client
+
+        client = asyncio.run(main())
+        self.assertEqual(client.limiter.in_flight, 0)
+        self.assertEqual((client.metrics.requests, client.metrics.cancelled), (1, 1))
+        self.assertEqual(client.hedge_stats.fired, 0)
+
+    def test_cancel_in_hedge_window(self):
+        self.run_cancelled(stream=False)
+
+    def test_cancel_stream_in_hedge_window(self):
+        self.run_cancelled(stream=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import json
+import logging
+import os
+import tempfile
+import unittest
+from applog import log_event, setup_logging, shutdown_logging
+
+class TestAppLog(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'log.jsonl')
+        root = logging.getLogger()
+        self.saved = (root.handlers[:], root.level)
+
+    def tearDown(self):
+        shutdown_logging()
+        root = logging.getLogger()
+        root.handlers[:], level = self.saved
+        root.setLevel(level)
+        self.tmpdir.cleanup()
+
+    def records(self):
+        with open(self.path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_structured_and_redacted(self):
+        setup_logging(self.path, console=False)
+        log_event("api_response", id="r1", chars=5, content="hello")
+        logging.info("plain message")
+        shutdown_logging()
+        first, second = self.records()
+        self.assertEqual(first["msg"], "api_response")
+        self.assertEqual(first["id"], "r1")
+        self.assertEqual(first["content"], {"redacted": True, "chars": 5})
+        self.assertEqual(second["msg"], "plain message")
+
+    def test_content_kept_without_redaction(self):
+        setup_logging(self.path, redact=False, console=False)
+        log_event("api_response", content="hello")
+        shutdown_logging()
+        self.assertEqual(self.records()[0]["content"], "hello")
+
+    def test_verbose_sampling(self):
+        setup_logging(self.path, sample_rate=0, console=False)
+        for _ in range(50):
+            log_event("api_request", verbose=True, total=0.1)
+        log_event("kept")
+        shutdown_logging()
+        self.assertEqual([r["msg"] for r in self.records()], ["kept"])
+
+    def test_rotation(self):
+        setup_logging(self.path, max_bytes=2000, backups=2, console=False)
+        for i in range(200):
+            log_event("event", index=i)
+        shutdown_logging()
+        self.assertTrue(os.path.exists(self.path + '.1'))
+        self.assertTrue(os.path.exists(self.path + '.2'))
+        self.assertFalse(os.path.exists(self.path + '.3'))
+        self.assertLessEqual(os.path.getsize(self.path), 2000)
+
+if __name__ == '__main__':
+    unittest.main()
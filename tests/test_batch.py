@@ -0,0 +1,69 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from batch import run_batch
+
+class FakeClient:
+    def __init__(self, fail_ids=()):
+        self.fail_ids = set(fail_ids)
+        self.calls = []
+
+    async def send_message_async(self, messages, model, **params):
+        prompt = messages[-1]['content']
+        self.calls.append(prompt)
+        await asyncio.sleep(0)
+        if prompt in self.fail_ids:
+            raise RuntimeError('boom')
+        message = SimpleNamespace(content=prompt.upper())
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.input = os.path.join(self.tmpdir.name, 'in.jsonl')
+        self.output = os.path.join(self.tmpdir.name, 'out.jsonl')
+        with open(self.input, 'w', encoding='utf-8') as f:
+            for i in range(10):
+                f.write(json.dumps({'id': i, 'prompt': f'p{i}', 'mode': 'Reasoner' if i == 0 else None}) + '\n')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def read_output(self):
+        with open(self.output, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_resume_skips_completed(self):
+        first = FakeClient(fail_ids={'p3'})
+        stats = asyncio.run(run_batch(first, self.input, self.output, 'deepseek-chat', concurrency=3))
+        self.assertEqual(stats, {'ok': 9, 'failed': 1, 'skipped': 0})
+        records = {r['id']: r for r in self.read_output()}
+        self.assertEqual(records['1']['reply'], 'P1')
+        self.assertEqual(records['0']['model'], 'deepseek-reasoner')
+
+        second = FakeClient()
+        stats = asyncio.run(run_batch(second, self.input, self.output, 'deepseek-chat'))
+        self.assertEqual(stats, {'ok': 1, 'failed': 0, 'skipped': 9})
+        self.assertEqual(second.calls, ['p3'])
+
+    def test_resume_after_torn_line(self):
+        asyncio.run(run_batch(FakeClient(), self.input, self.output, 'deepseek-chat'))
+        with open(self.output, encoding='utf-8') as f:
+            lines = f.readlines()
+        with open(self.output, 'w', encoding='utf-8') as f:
+            f.writelines(lines[:-1])
+            f.write(lines[-1][:20])  # 崩溃时写了半行
+
+        second = FakeClient()
+        stats = asyncio.run(run_batch(second, self.input, self.output, 'deepseek-chat'))
+        self.assertEqual(stats, {'ok': 1, 'failed': 0, 'skipped': 9})
+        self.assertEqual(sorted(r['id'] for r in self.read_output()), sorted(str(i) for i in range(10)))
+
+        stats = asyncio.run(run_batch(FakeClient(), self.input, self.output, 'deepseek-chat'))
+        self.assertEqual(stats, {'ok': 0, 'failed': 0, 'skipped': 10})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,37 @@
+import asyncio
+import itertools
+import threading
+import time
 import unittest
-from chatWithDs import ConversationManager
+from concurrent.futures import Future
+from types import SimpleNamespace
+from unittest import mock
+import summarizer
+from chatWithDs import ChatbotGUI, ChatSession, ConversationManager, estimate_tokens
+from ratelimit import AdaptiveLimiter, call_with_retry
+from scheduler import SessionScheduler
+from tests.test_transcript import RecordingText
+from transcript import Transcript, TranscriptView
+
+class FakeRoot:
+    def after(self, delay, callback, *args):
+        pass  # 测试中手动刷新
+
+def make_session():
+    """A ChatSession whose view draws into a recording stand-in instead of a Tk widget"""
+    session = ChatSession.__new__(ChatSession)
+    session.root = FakeRoot()
+    session.transcript = Transcript()
+    session.transcript_view = TranscriptView(RecordingText(), session.transcript)
+    session.active_requests = {}
+    session.background_requests = set()
+    session._request_ids = itertools.count(1)
+    session._stream_buffer = []
+    session._stream_lock = threading.Lock()
+    session._stream_active = False
+    session._stream_ids = itertools.count(1)
+    session._streams = {}
+    return session
 
 class TestConversationManager(unittest.TestCase):
     def setUp(self):
@@ -16,5 +48,209 @@ class TestConversationManager(unittest.TestCase):
             self.manager.add_message('user', f'Message {i}')
         self.assertEqual(len(self.manager.history), 15)  # 15 pairs, so 15 total
 
+    def test_token_budget_trim(self):
+        manager = ConversationManager(token_budgets={'deepseek-chat': 100})
+        manager.add_message('user', 'x' * 1000)  # 单条超预算时仍保留
+        self.assertEqual(len(manager.history), 1)
+        for i in range(10):
+            manager.add_message('user', f'Message {i}')
+        self.assertLessEqual(manager.total_tokens, 100)
+        self.assertEqual(manager.history[-1]['content'], 'Message 9')
+        self.assertEqual(manager.total_tokens, sum(manager.token_counts))
+
+    def test_build_messages_no_duplicates(self):
+        self.manager.add_message('user', 'Hello')
+        self.manager.add_message('assistant', 'Hi')
+        messages = self.manager.build_messages('Next', '', 'deepseek-chat')
+        self.assertEqual([m['role'] for m in messages], ['system', 'user', 'assistant', 'user'])
+        self.assertEqual(messages[-1]['content'], 'Next')
+
+    def test_prefix_stable_across_turns(self):
+        manager = ConversationManager(token_budgets={'deepseek-chat': 200})
+        prefixes = []
+        for i in range(30):
+            messages = manager.build_messages(f'Question {i}', '', 'deepseek-chat')
+            prefixes.append(messages[1]['content'])
+            self.assertEqual(messages[0]['role'], 'system')
+            self.assertEqual(messages[1]['role'], 'user')
+            manager.add_message('user', f'Question {i}')
+            manager.add_message('assistant', f'Answer {i} ' + 'x' * 40)
+        # 窗口起点只在超预算时跳跃，而不是每轮都滑动
+        self.assertLess(len(set(prefixes)), len(prefixes) // 2)
+
+    def test_compaction(self):
+        manager = ConversationManager(token_budgets={'deepseek-chat': 200})
+        self.assertIsNone(manager.plan_compaction('deepseek-chat'))
+        job = None
+        for i in range(8):
+            manager.add_message('user', f'Question {i}')
+            manager.add_message('assistant', f'Answer {i} ' + 'x' * 40)
+            # 与界面一致：每轮结束后检查是否需要压缩，在截断之前触发
+            job = manager.plan_compaction('deepseek-chat')
+            if job:
+                break
+        end, messages = job
+        self.assertEqual(messages[0]['content'], 'Question 0')
+        self.assertIsNone(manager.plan_compaction('deepseek-chat'))  # 同一时间只压缩一次
+        manager.apply_compaction(end, 'summary of early turns')
+        sent = manager.build_messages('Next', '', 'deepseek-chat')
+        self.assertIn('summary of early turns', sent[0]['content'])
+        # 已并入摘要的消息不再重复发送
+        self.assertNotIn({'role': 'user', 'content': 'Question 0'}, sent)
+        self.assertEqual(sent[1], manager.history[end - manager.dropped])
+        self.assertEqual(sent[1]['role'], 'user')
+
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(''), 0)
+        self.assertGreater(estimate_tokens('你好世界'), estimate_tokens('abcd'))
+
+class TestChatSessionStream(unittest.TestCase):
+    def contents(self, session):
+        return [(e['role'], e['content']) for e in session.transcript.entries]
+
+    def test_preempt_keeps_old_deltas_in_old_reply(self):
+        session = make_session()
+        session.display_message('q1')
+        first = session.begin_stream()
+        session.feed_stream('hello', first)
+        session._flush_stream(reschedule=False)
+        session.feed_stream(' world', first)  # 尚未刷新时发送了新消息
+        session.preempt()
+        second = session.begin_stream()
+        session.display_message('q2')
+        session.feed_stream('late', first)  # 已取消请求的残余片段被丢弃
+        session.feed_stream('new', second)
+        session.end_stream(second)
+        self.assertEqual(self.contents(session), [
+            ('user', 'q1'), ('assistant', 'hello world'), ('user', 'q2'), ('assistant', 'new')
+        ])
+
+    def test_overlapping_streams_without_preempt(self):
+        session = make_session()
+        session.display_message('q1')
+        first = session.begin_stream()
+        session.feed_stream('first part', first)
+        session._flush_stream(reschedule=False)
+        second = session.begin_stream()  # 未开启打断：第一条回复继续输出
+        session.display_message('q2')
+        session.feed_stream(' and the rest', first)
+        session.feed_stream('second', second)
+        session._flush_stream(reschedule=False)
+        session.end_stream(first)
+        self.assertTrue(session._stream_active)
+        session.feed_stream(' reply', second)
+        session.end_stream(second)
+        self.assertFalse(session._stream_active)
+        self.assertEqual(self.contents(session), [
+            ('user', 'q1'), ('assistant', 'first part and the rest'),
+            ('user', 'q2'), ('assistant', 'second reply')
+        ])
+
+    def test_preempt_spares_background_requests(self):
+        session = make_session()
+        reply, summary = Future(), Future()
+        session.track_request(reply)
+        session.track_request(summary, background=True)
+        session.preempt()
+        self.assertTrue(reply.cancelled())
+        self.assertFalse(summary.cancelled())
+        session.cancel_request()  # 停止按钮仍会取消总结
+        self.assertTrue(summary.cancelled())
+
+    def test_notice_mid_stream_is_not_extended(self):
+        session = make_session()
+        stream = session.begin_stream()
+        session.feed_stream('think', stream, kind='reasoning')
+        session.feed_stream('ans', stream)
+        session._flush_stream(reschedule=False)
+        session.display_notice('已索引文档')
+        session.feed_stream('wer', stream)
+        session.end_stream(stream)
+        self.assertEqual(self.contents(session), [
+            ('reasoning', 'think'), ('assistant', 'answer'), ('notice', '已索引文档')
+        ])
+        self.assertTrue(session.transcript.entries[0]['collapsed'])
+
+class TestBackgroundJobs(unittest.TestCase):
+    def test_compaction_waits_for_scheduler_slot(self):
+        calls = []
+
+        class Client:
+            async def send_message_async(self, messages, model, **params):
+                calls.append(model)
+                message = SimpleNamespace(content='summary')
+                return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+        gui = ChatbotGUI.__new__(ChatbotGUI)
+        gui.api_client = Client()
+        gui.scheduler = SessionScheduler(concurrency=2, reserved=1)
+        manager = ConversationManager(token_budgets={'deepseek-chat': 200})
+        session = SimpleNamespace(key='a', conversation_manager=manager)
+        for i in range(8):
+            manager.add_message('user', f'Question {i}')
+            manager.add_message('assistant', f'Answer {i} ' + 'x' * 40)
+            job = manager.plan_compaction('deepseek-chat')
+            if job:
+                break
+
+        async def main():
+            # 另一个标签页的长任务占满了长任务名额，压缩需排队
+            await gui.scheduler.acquire('b', long=True)
+            task = asyncio.ensure_future(gui._compact(session, *job))
+            await asyncio.sleep(0.01)
+            self.assertEqual(calls, [])
+            self.assertEqual(gui.scheduler.waiting('a'), 1)
+            gui.scheduler.release('b', long=True)
+            await task
+
+        asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(manager.memory, 'summary')
+        self.assertEqual(gui.scheduler.in_flight, 0)
+
+    def test_summary_fan_out_leaves_room_for_other_tabs(self):
+        limiter = AdaptiveLimiter(initial_concurrency=3, max_concurrency=3, rpm=60000)
+        started = {}
+
+        class Client:
+            async def send_message_async(self, messages, model, **params):
+                prompt = messages[-1]['content']
+
+                async def call():
+                    started.setdefault(prompt, time.monotonic())
+                    await asyncio.sleep(0.05)
+                    message = SimpleNamespace(content='summary')
+                    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+                return await call_with_retry(limiter, call)
+
+        gui = ChatbotGUI.__new__(ChatbotGUI)
+        gui.api_client = Client()
+        gui.scheduler = SessionScheduler(concurrency=lambda: limiter.concurrency, reserved=1)
+        gui.persist_turn = lambda *args: None
+        session = SimpleNamespace(key='a', conversation_manager=ConversationManager())
+        text = ''.join(f'{i}' * 30 + '\n' for i in range(12))
+
+        async def chat():
+            await asyncio.sleep(0.01)
+            submitted = time.monotonic()
+            async with gui.scheduler.slot('b'):
+                await gui.api_client.send_message_async([{'role': 'user', 'content': 'chat'}], 'm')
+            return started['chat'] - submitted
+
+        async def main():
+            with mock.patch.multiple(summarizer, MAP_CHUNK_TOKENS=10, REDUCE_INPUT_TOKENS=20):
+                summary, delay = await asyncio.gather(
+                    gui._summarize(session, 'doc', text, 'm', None, None), chat()
+                )
+            return summary, delay
+
+        summary, delay = asyncio.run(main())
+        self.assertEqual(summary, 'summary')
+        # 另一标签页的对话立即发出，不排在十几个分段调用之后
+        self.assertLess(delay, 0.04)
+        self.assertEqual((limiter.in_flight, gui.scheduler.in_flight), (0, 0))
+        self.assertEqual(len(session.conversation_manager.history), 2)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import unittest
+from concurrent.futures import CancelledError
+from engine import AsyncEngine
+
+class TestAsyncEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = AsyncEngine().start()
+
+    def tearDown(self):
+        self.engine.stop()
+
+    def test_submit_returns_result(self):
+        async def work():
+            await asyncio.sleep(0)
+            return threading.current_thread().name
+
+        self.assertEqual(self.engine.submit(work()).result(2), 'AsyncEngine')
+        self.assertTrue(self.engine.running)
+
+    def test_submit_propagates_exception(self):
+        async def fail():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            self.engine.submit(fail()).result(2)
+
+    def test_cancel_reaches_task(self):
+        started, finished = threading.Event(), threading.Event()
+        cancelled = []
+
+        async def slow():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)  # 取消在引擎循环的任务内生效，finally等清理会执行
+                raise
+            finally:
+                finished.set()
+
+        future = self.engine.submit(slow())
+        self.assertTrue(started.wait(2))
+        self.assertTrue(future.cancel())
+        self.assertTrue(finished.wait(2))
+        self.assertEqual(cancelled, [True])
+        with self.assertRaises(CancelledError):
+            future.result(0)
+
+    def test_stop_cancels_pending(self):
+        started, cleaned_up = threading.Event(), threading.Event()
+
+        async def pending():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            finally:
+                cleaned_up.set()
+
+        future = self.engine.submit(pending())
+        self.assertTrue(started.wait(2))
+        self.engine.stop()
+        self.assertTrue(cleaned_up.is_set())  # stop()等待任务清理完毕
+        self.assertTrue(future.cancelled())
+        self.assertFalse(self.engine.running)
+        self.engine.stop()  # 重复调用无副作用
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import json
+import os
+import tempfile
+import unittest
+from docx import Document
+from export import export_transcript
+
+RECORDS = [
+    {"role": "user", "content": "hello"},
+    {"role": "assistant", "content": "line one\nYou: not a speaker"},
+]
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_jsonl_round_trip(self):
+        calls = []
+        export_transcript(RECORDS, self.path('chat.jsonl'), lambda done, total: calls.append((done, total)))
+        with open(self.path('chat.jsonl'), encoding='utf-8') as f:
+            self.assertEqual([json.loads(line) for line in f], RECORDS)
+        self.assertEqual(calls, [(2, 2)])
+
+    def test_markdown(self):
+        export_transcript(RECORDS, self.path('chat.md'))
+        with open(self.path('chat.md'), encoding='utf-8') as f:
+            text = f.read()
+        self.assertTrue(text.startswith('**You:**\n\nhello'))
+        self.assertEqual(text.count('**Assistant:**'), 1)
+
+    def test_docx_keeps_speakers(self):
+        export_transcript(RECORDS, self.path('chat.docx'))
+        paragraphs = [p.text for p in Document(self.path('chat.docx')).paragraphs]
+        self.assertEqual(paragraphs[1:], ['You:', 'hello', 'Assistant:', 'line one\nYou: not a speaker'])
+        self.assertFalse(os.path.exists(self.path('chat.docx.part')))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            export_transcript(RECORDS, self.path('chat.pdf'))
+
+if __name__ == '__main__':
+    unittest.main()
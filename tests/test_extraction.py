@@ -0,0 +1,77 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from docx import Document
+import extraction
+from benchmarks.run import make_pdf
+from extraction import ExtractionCancelled, extract_docx, extract_txt, iter_pdf_pages
+
+class TestExtraction(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_docx_includes_tables_in_order(self):
+        path = os.path.join(self.tmpdir.name, 'doc.docx')
+        doc = Document()
+        doc.add_paragraph('Intro')
+        table = doc.add_table(rows=2, cols=2)
+        table.cell(0, 0).text = 'a'
+        table.cell(0, 1).text = 'b'
+        table.cell(1, 0).merge(table.cell(1, 1)).text = 'merged'
+        doc.add_paragraph('End')
+        doc.save(path)
+        self.assertEqual(extract_docx(path), 'Intro\na\tb\nmerged\nEnd')
+
+    def test_txt(self):
+        path = os.path.join(self.tmpdir.name, 'doc.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('你好')
+        self.assertEqual(extract_txt(path), '你好')
+
+class TestPdfExtraction(unittest.TestCase):
+    PAGES = 40
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'doc.pdf')
+        make_pdf(self.path, pages=self.PAGES, lines=2)
+        # 小文件也走进程池，且拆成多个任务
+        patcher = mock.patch.multiple(extraction, PARALLEL_MIN_PAGES=1, PAGES_PER_TASK=4)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(extraction.shutdown_pool)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_parallel_pages_in_order(self):
+        serial = list(iter_pdf_pages(self.path, max_workers=1))
+        parallel = list(iter_pdf_pages(self.path, max_workers=2))
+        self.assertEqual(len(parallel), self.PAGES)
+        self.assertEqual(parallel, serial)
+        for i, text in enumerate(parallel):
+            self.assertIn(f'Page {i} line 0', text)
+
+    def test_parallel_progress(self):
+        progress = []
+        list(iter_pdf_pages(self.path, lambda done, total: progress.append((done, total)), max_workers=2))
+        self.assertEqual(progress, [(done, self.PAGES) for done in range(4, self.PAGES + 1, 4)])
+
+    def test_cancel(self):
+        cancel = threading.Event()
+        pages = []
+        with self.assertRaises(ExtractionCancelled):
+            for text in iter_pdf_pages(self.path, lambda done, total: cancel.set(),
+                                       cancel_event=cancel, max_workers=2):
+                pages.append(text)
+        self.assertEqual(len(pages), 4)  # 第一个任务的页面已产出，之后立即中止
+        # 共享进程池在取消后仍可使用
+        self.assertEqual(len(list(iter_pdf_pages(self.path, max_workers=2))), self.PAGES)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+from extraction_cache import ExtractionCache
+
+class TestExtractionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = ExtractionCache(path=os.path.join(self.tmpdir.name, 'cache.sqlite3'))
+        self.calls = 0
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def extract(self, path):
+        self.calls += 1
+        with open(path, encoding='utf-8') as f:
+            return f.read().upper()
+
+    def write(self, name, text):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def test_hit_by_content(self):
+        a = self.write('a.txt', 'same content')
+        b = self.write('b.txt', 'same content')
+        self.assertEqual(self.cache.get_or_extract(a, self.extract), 'SAME CONTENT')
+        self.assertEqual(self.cache.get_or_extract(b, self.extract), 'SAME CONTENT')
+        self.assertEqual(self.calls, 1)
+
+    def test_changed_file_is_reextracted(self):
+        a = self.write('a.txt', 'one')
+        self.cache.get_or_extract(a, self.extract)
+        a = self.write('a.txt', 'two!')
+        self.assertEqual(self.cache.get_or_extract(a, self.extract), 'TWO!')
+        self.assertEqual(self.calls, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+from extraction_cache import ExtractionCache
+from ingest import build_corpus, collect_files, similarity, sketch
+
+BOILERPLATE = 'This document is confidential and intended solely for the named recipient of this message.'
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self.tmpdir.name, 'docs')
+        os.makedirs(os.path.join(self.folder, 'sub'))
+        self.write('a.txt', f'Quarterly revenue grew by twelve percent in the northern region.\n\n{BOILERPLATE}')
+        self.write('sub/b.txt', f'Hiring plans for the next year focus on the platform engineering team.\n\n{BOILERPLATE.upper()}')
+        shutil.copy(os.path.join(self.folder, 'a.txt'), os.path.join(self.folder, 'sub', 'copy.txt'))
+        self.write('notes.md', 'ignored')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, name, text):
+        with open(os.path.join(self.folder, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_collect_files(self):
+        files = collect_files([self.folder], {'.txt'})
+        self.assertEqual([os.path.basename(f) for f in files], ['a.txt', 'b.txt', 'copy.txt'])
+
+    def test_near_duplicate_sketch(self):
+        edited = BOILERPLATE.replace('solely', 'only')
+        self.assertGreater(similarity(sketch(BOILERPLATE), sketch(edited)), 0.6)
+        self.assertLess(similarity(sketch(BOILERPLATE), sketch('Completely different text about cooking pasta at home.')), 0.2)
+
+    def test_build_corpus_dedupes(self):
+        cache = ExtractionCache(path=os.path.join(self.tmpdir.name, 'cache.sqlite3'))
+        try:
+            for _ in range(2):  # 第二次使用缓存的分块
+                text, stats = build_corpus([self.folder], {'.txt'}, cache=cache, max_workers=2)
+                self.assertEqual(text.count('confidential'), 1)
+                self.assertEqual((stats['included'], stats['duplicate_files'], stats['duplicate_blocks']), (2, 1, 1))
+                self.assertIn('【b.txt】', text)
+        finally:
+            cache.close()
+
+    def test_size_bound(self):
+        text, stats = build_corpus([self.folder], {'.txt'}, max_workers=1, max_tokens=30)
+        self.assertEqual(stats['included'], 1)
+        # a.txt部分导入，不计入未导入的文件
+        self.assertEqual(stats['truncated'], 2)
+
+    def test_unreadable_file_is_reported(self):
+        os.symlink(os.path.join(self.folder, 'missing.txt'), os.path.join(self.folder, 'gone.txt'))
+        cache = ExtractionCache(path=os.path.join(self.tmpdir.name, 'cache.sqlite3'))
+        try:
+            text, stats = build_corpus([self.folder], {'.txt'}, cache=cache, max_workers=1)
+        finally:
+            cache.close()
+        self.assertEqual(stats['included'], 2)
+        self.assertEqual(len(stats['failed']), 1)
+        self.assertTrue(stats['failed'][0].startswith('gone.txt:'))
+
+if __name__ == '__main__':
+    unittest.main()
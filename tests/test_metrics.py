@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from metrics import RequestMetrics, RequestSpan
+
+def finished_span(stream=True):
+    span = RequestSpan('deepseek-chat', stream=stream)
+    span.on_attempt(0.25)
+    span.on_first_chunk()
+    time.sleep(0.01)
+    span.finish(SimpleNamespace(prompt_tokens=100, completion_tokens=20, prompt_cache_hit_tokens=64))
+    return span
+
+class TestRequestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_span(self):
+        record = finished_span().as_dict()
+        self.assertEqual(record['queue_wait'], 0.25)
+        self.assertEqual((record['prompt_tokens'], record['cache_hit_tokens']), (100, 64))
+        self.assertGreaterEqual(record['total'], record['ttft'])
+        self.assertGreater(record['tokens_per_second'], 0)
+
+    def test_upstream_queue_time(self):
+        span = RequestSpan('deepseek-chat', queued=0.5)
+        span.on_attempt(0.25)
+        span.finish()
+        record = span.as_dict()
+        self.assertEqual(record['queue_wait'], 0.75)
+        self.assertGreaterEqual(record['total'], 0.5)
+
+    def test_jsonl_file(self):
+        path = os.path.join(self.tmpdir.name, 'metrics.jsonl')
+        metrics = RequestMetrics(path=path)
+        metrics.record(finished_span())
+        failed = RequestSpan('deepseek-chat')
+        failed.finish(error=TimeoutError())
+        metrics.record(failed)
+        metrics.close()
+        with open(path, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([r['error'] for r in records], [None, 'TimeoutError'])
+        self.assertEqual((metrics.requests, metrics.errors), (2, 1))
+        self.assertEqual(len(metrics.rolling['total']), 1)
+        self.assertIn('p95', metrics.summary())
+
+    def test_prometheus_file(self):
+        path = os.path.join(self.tmpdir.name, 'metrics.prom')
+        metrics = RequestMetrics(path=path)
+        metrics.record(finished_span())
+        metrics.flush()
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        metrics.close()
+        self.assertIn('chatwithds_request_queue_wait_seconds{quantile="0.5"} 0.25', text)
+        self.assertIn('chatwithds_completion_tokens_total 20', text)
+
+    def test_record_does_not_write_on_caller_thread(self):
+        path = os.path.join(self.tmpdir.name, 'metrics.jsonl')
+        metrics = RequestMetrics(path=path)
+        writer_threads = []
+        write = metrics._write
+
+        def tracked(records):
+            writer_threads.append(threading.current_thread().name)
+            write(records)
+
+        metrics._write = tracked
+        metrics.record(finished_span())
+        metrics.close()
+        self.assertEqual(set(writer_threads), {'RequestMetrics'})
+
+    def test_jsonl_rotation(self):
+        path = os.path.join(self.tmpdir.name, 'metrics.jsonl')
+        metrics = RequestMetrics(path=path, max_bytes=2000, backups=2)
+        for _ in range(40):
+            metrics.record(finished_span(stream=False))
+            metrics.flush()
+        metrics.close()
+        self.assertTrue(os.path.exists(path + '.1'))
+        self.assertTrue(os.path.exists(path + '.2'))
+        self.assertFalse(os.path.exists(path + '.3'))
+        self.assertLessEqual(os.path.getsize(path), 2000)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import asyncio
+import unittest
+from api import APIClient
+from benchmarks.mock_server import MockServer
+from ratelimit import AdaptiveLimiter
+from scheduler import SessionScheduler
+
+MESSAGES = [{'role': 'user', 'content': 'hi'}]
+
+class TestMockServer(unittest.TestCase):
+    def run_client(self, server, stream):
+        async def main():
+            client = APIClient('test-key', base_url=server.base_url,
+                               limiter=AdaptiveLimiter(base_delay=0.01))
+            try:
+                if not stream:
+                    response = await client.send_message_async(MESSAGES, 'deepseek-chat')
+                    return response.choices[0].message.content, response.usage
+                parts, usage = [], None
+                async for chunk in client.stream_message(MESSAGES, 'deepseek-chat',
+                                                         stream_options={'include_usage': True}):
+                    if chunk.usage is not None:
+                        usage = chunk.usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                return ''.join(parts), usage
+            finally:
+                await client.aclose()
+                client.close()
+        return asyncio.run(main())
+
+    def test_completion_and_stream(self):
+        with MockServer(latency=0, tokens_per_second=10000, reply_tokens=5) as server:
+            for stream in (False, True):
+                reply, usage = self.run_client(server, stream)
+                self.assertEqual(reply, 'tok ' * 5)
+                self.assertEqual(usage.completion_tokens, 5)
+
+    def test_reasoner_stream(self):
+        with MockServer(latency=0, tokens_per_second=10000, reply_tokens=3, reasoning_tokens=4) as server:
+            async def main():
+                client = APIClient('test-key', base_url=server.base_url)
+                thoughts, answer = [], []
+                try:
+                    async for chunk in client.stream_message(MESSAGES, 'deepseek-reasoner',
+                                                             stream_options={'include_usage': True}):
+                        if chunk.choices:
+                            thoughts.append(getattr(chunk.choices[0].delta, 'reasoning_content', None) or '')
+                            answer.append(chunk.choices[0].delta.content or '')
+                finally:
+                    await client.aclose()
+                    client.close()
+                return ''.join(thoughts), ''.join(answer), client.metrics.last
+            thoughts, answer, record = asyncio.run(main())
+        self.assertEqual((thoughts, answer), ('think ' * 4, 'tok ' * 3))
+        self.assertEqual(record['reasoning_tokens'], 4)
+        self.assertGreaterEqual(record['time_to_answer'], record['ttft'])
+
+    def test_cancel_mid_stream_releases_slots(self):
+        # 停止/新消息打断会取消引擎任务：限流器和调度器名额都要立即归还
+        with MockServer(latency=0, tokens_per_second=50, reply_tokens=200) as server:
+            async def main():
+                limiter = AdaptiveLimiter(initial_concurrency=1, max_concurrency=1)
+                scheduler = SessionScheduler(concurrency=lambda: limiter.concurrency)
+                client = APIClient('test-key', base_url=server.base_url, limiter=limiter)
+                started = asyncio.Event()
+
+                async def turn(session):
+                    async with scheduler.slot(session):
+                        async for chunk in client.stream_message(MESSAGES, 'deepseek-chat'):
+                            started.set()
+                        return session
+
+                try:
+                    first = asyncio.ensure_future(turn('a'))
+                    await started.wait()
+                    self.assertEqual((limiter.in_flight, scheduler.in_flight), (1, 1))
+                    queued = asyncio.ensure_future(turn('b'))
+                    await asyncio.sleep(0.05)
+                    self.assertEqual(scheduler.waiting('b'), 1)
+                    first.cancel()
+                    await asyncio.gather(first, return_exceptions=True)
+                    # 两种名额都交给了排队中的另一会话，而不是被已取消的请求占着
+                    await asyncio.sleep(0.05)
+                    self.assertEqual(scheduler.running, {'b': 1})
+                    self.assertEqual((limiter.in_flight, scheduler.waiting()), (1, 0))
+                    queued.cancel()
+                    await asyncio.gather(queued, return_exceptions=True)
+                    self.assertEqual((limiter.in_flight, scheduler.in_flight), (0, 0))
+                finally:
+                    await client.aclose()
+                    client.close()
+                return client.metrics
+
+            metrics = asyncio.run(main())
+        self.assertEqual(metrics.requests, 2)
+
+    def test_injected_errors_are_retried(self):
+        with MockServer(latency=0, tokens_per_second=10000, reply_tokens=1,
+                        error_rate=0.5, seed=3) as server:
+            for _ in range(4):
+                reply, _ = self.run_client(server, stream=False)
+                self.assertEqual(reply, 'tok ')
+            self.assertGreater(server.errors, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import asyncio
+import unittest
+import httpx
+import openai
+from ratelimit import AdaptiveLimiter, TokenBucket, call_with_retry
+
+def rate_limit_error(retry_after='0'):
+    request = httpx.Request('POST', 'https://api.deepseek.com/v1/chat/completions')
+    response = httpx.Response(429, headers={'retry-after': retry_after}, request=request)
+    return openai.RateLimitError('rate limited', response=response, body=None)
+
+class TestRateLimit(unittest.TestCase):
+    def test_token_bucket(self):
+        bucket = TokenBucket(60, capacity=2)
+        self.assertEqual(bucket.wait_time(2), 0)
+        bucket.consume(2)
+        self.assertGreater(bucket.wait_time(1), 0.5)
+
+    def test_concurrency_limit(self):
+        limiter = AdaptiveLimiter(initial_concurrency=2, max_concurrency=2, rpm=6000)
+        peak = 0
+
+        async def work():
+            nonlocal peak
+            async with limiter.slot():
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        async def main():
+            await asyncio.gather(*(work() for _ in range(8)))
+
+        asyncio.run(main())
+        self.assertEqual(peak, 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_retry_and_aimd(self):
+        limiter = AdaptiveLimiter(initial_concurrency=4, rpm=6000, base_delay=0.001)
+        attempts = 0
+
+        async def flaky():
+            nonlocal attempts
+            attempts += 1
+            if attempts < 3:
+                raise rate_limit_error()
+            return 'ok'
+
+        self.assertEqual(asyncio.run(call_with_retry(limiter, flaky)), 'ok')
+        self.assertEqual(attempts, 3)
+        self.assertLess(limiter.limit, 4)
+
+    def test_non_retryable_raises(self):
+        limiter = AdaptiveLimiter()
+
+        async def broken():
+            raise ValueError('bad request')
+
+        with self.assertRaises(ValueError):
+            asyncio.run(call_with_retry(limiter, broken))
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_throttle_on_final_attempt(self):
+        limiter = AdaptiveLimiter(initial_concurrency=8, rpm=6000, max_attempts=2, base_delay=0.001)
+
+        async def limited():
+            raise rate_limit_error()
+
+        with self.assertRaises(openai.RateLimitError):
+            asyncio.run(call_with_retry(limiter, limited))
+        # 两次429都应减半并发，包括不再重试的最后一次
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+from response_cache import ResponseCache
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(path=os.path.join(self.tmpdir.name, 'cache.sqlite3'), max_bytes=100)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def test_key_normalization(self):
+        a = ResponseCache.make_key('deepseek-chat', [{'role': 'user', 'content': 'Hello  \r\n'}])
+        b = ResponseCache.make_key('deepseek-chat', [{'role': 'user', 'content': 'Hello'}])
+        c = ResponseCache.make_key('deepseek-reasoner', [{'role': 'user', 'content': 'Hello'}])
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get('k'))
+        self.cache.put('k', 'deepseek-chat', 'reply')
+        self.assertEqual(self.cache.get('k'), 'reply')
+
+    def test_lru_eviction(self):
+        self.cache.put('a', 'deepseek-chat', 'x' * 40)
+        self.cache.put('b', 'deepseek-chat', 'y' * 40)
+        self.cache.get('a')  # a 变为最近使用
+        self.cache.put('c', 'deepseek-chat', 'z' * 40)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+from retrieval import DocumentIndex, format_context, tokenize
+
+class TestDocumentIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index = DocumentIndex(path=os.path.join(self.tmpdir.name, 'index.sqlite3'))
+
+    def tearDown(self):
+        self.index.close()
+        self.tmpdir.cleanup()
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('Hello 合同条款'), ['hello', '合同', '同条', '条款'])
+
+    def test_search_ranks_relevant_chunk(self):
+        text = '\n'.join(
+            ['Payment is due within thirty days of invoice.' * 20] +
+            ['The warranty period is two years from delivery.' * 20] +
+            ['违约责任：任何一方违约应赔偿对方损失。' * 20]
+        )
+        doc_id, count = self.index.add_document('contract.txt', text, 'digest-1')
+        self.assertGreater(count, 1)
+        results = self.index.search('how long is the warranty', k=1)
+        self.assertIn('warranty', results[0][2])
+        results = self.index.search('违约怎么赔偿', k=1, doc_ids={doc_id})
+        self.assertIn('违约', results[0][2])
+        self.assertEqual(self.index.search('warranty', doc_ids={doc_id + 1}), [])
+        self.assertIn('contract.txt', format_context(results))
+
+    def test_same_digest_not_reindexed(self):
+        first = self.index.add_document('a.txt', 'alpha beta', 'same')
+        second = self.index.add_document('b.txt', 'alpha beta', 'same')
+        self.assertEqual(first, second)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+from scheduler import SessionScheduler
+
+class TestSessionScheduler(unittest.TestCase):
+    def run_jobs(self, scheduler, jobs, duration=0.01):
+        """Run (session, long) jobs submitted in order; returns the order in which they started"""
+        started = []
+
+        async def job(session, long, name):
+            async with scheduler.slot(session, long):
+                started.append(name)
+                await asyncio.sleep(duration)
+
+        async def main():
+            await asyncio.gather(*(job(s, l, f"{s}{i}") for i, (s, l) in enumerate(jobs)))
+
+        asyncio.run(main())
+        self.assertEqual(scheduler.in_flight, 0)
+        self.assertEqual(scheduler.waiting(), 0)
+        return started
+
+    def test_round_robin_across_sessions(self):
+        scheduler = SessionScheduler(concurrency=1)
+        order = self.run_jobs(scheduler, [('a', False)] * 3 + [('b', False)] * 2)
+        self.assertEqual(order, ['a0', 'b3', 'a1', 'b4', 'a2'])
+
+    def test_focused_session_first(self):
+        scheduler = SessionScheduler(concurrency=1)
+        scheduler.focus('b')
+        order = self.run_jobs(scheduler, [('a', False)] * 2 + [('b', False)] * 2)
+        self.assertEqual(order, ['a0', 'b2', 'b3', 'a1'])
+
+    def test_long_jobs_leave_a_slot(self):
+        scheduler = SessionScheduler(concurrency=2, reserved=1)
+        order = []
+
+        async def job(session, long, name, duration):
+            async with scheduler.slot(session, long):
+                order.append(name)
+                await asyncio.sleep(duration)
+
+        async def main():
+            reasoner = [asyncio.ensure_future(job('a', True, f'long{i}', 0.2)) for i in range(3)]
+            await asyncio.sleep(0.01)
+            await job('b', False, 'chat', 0)
+            order.append('chat done')
+            self.assertEqual(scheduler.long_running, 1)
+            await asyncio.gather(*reasoner)
+
+        asyncio.run(main())
+        self.assertEqual(order[:3], ['long0', 'chat', 'chat done'])
+
+    def test_cancel_while_queued(self):
+        scheduler = SessionScheduler(concurrency=1)
+
+        async def main():
+            await scheduler.acquire('a')
+            waiter = asyncio.ensure_future(scheduler.acquire('b'))
+            await asyncio.sleep(0)
+            self.assertEqual(scheduler.waiting('b'), 1)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            self.assertEqual(scheduler.waiting(), 0)
+            scheduler.release('a')
+            self.assertEqual(scheduler.in_flight, 0)
+
+        asyncio.run(main())
+
+    def test_slot_reports_queue_time(self):
+        scheduler = SessionScheduler(concurrency=1)
+        waits = {}
+
+        async def job(session):
+            async with scheduler.slot(session) as queued:
+                waits[session] = queued
+                await asyncio.sleep(0.05)
+
+        async def main():
+            await asyncio.gather(job('a'), job('b'))
+
+        asyncio.run(main())
+        self.assertLess(waits['a'], 0.01)
+        self.assertGreaterEqual(waits['b'], 0.04)
+
+    def test_follows_dynamic_concurrency(self):
+        limit = [1]
+        scheduler = SessionScheduler(concurrency=lambda: limit[0])
+        self.assertEqual(scheduler.concurrency, 1)
+        limit[0] = 4
+        self.assertEqual(scheduler.concurrency, 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE = "import json, sys; import {module}; print(json.dumps(sorted(m for m in ('openai', 'httpx', 'docx', 'PyPDF2') if m in sys.modules)))"
+
+class TestLazyImports(unittest.TestCase):
+    def loaded_after_import(self, module):
+        output = subprocess.check_output([sys.executable, '-c', PROBE.format(module=module)], cwd=ROOT, text=True)
+        return json.loads(output)
+
+    def test_heavy_dependencies_not_imported_at_startup(self):
+        for module in ('api', 'ratelimit', 'extraction', 'export', 'batch'):
+            self.assertEqual(self.loaded_after_import(module), [], module)
+
+    def test_api_client_builds_transport_on_first_use(self):
+        code = ("import sys; from api import APIClient; c = APIClient('k'); assert 'openai' not in sys.modules; "
+                "c.client; assert 'openai' in sys.modules; c.close()")
+        subprocess.check_call([sys.executable, '-c', code], cwd=ROOT)
+
+if __name__ == '__main__':
+    unittest.main()
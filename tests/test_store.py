@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from store import ConversationStore
+
+class TestConversationStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = ConversationStore(path=os.path.join(self.tmpdir.name, 'store.sqlite3'))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_write_and_page(self):
+        session = ConversationStore.new_session_id()
+        self.store.add_session(session, 'first question')
+        for i in range(5):
+            self.store.add_message(session, 'user', f'question {i}', 'deepseek-chat')
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, prompt_cache_hit_tokens=8)
+        self.store.add_message(session, 'assistant', 'answer', 'deepseek-chat', usage)
+        self.store.flush()
+        self.assertEqual(self.store.list_sessions()[0][:2], (session, 'first question'))
+        page = self.store.load_messages(session, limit=2)
+        self.assertEqual([m['content'] for m in page], ['question 4', 'answer'])
+        older = self.store.load_messages(session, limit=10, before_id=page[0]['id'])
+        self.assertEqual(len(older), 4)
+
+    def test_bad_row_does_not_stop_writer(self):
+        session = ConversationStore.new_session_id()
+        self.store.add_session(session, 'q')
+        self.store.add_message(session, 'user', 'q')
+        self.store.add_message(session, None, 'broken')  # role NOT NULL
+        self.store.add_message(session, 'assistant', None)
+        with self.assertLogs(level='ERROR'):
+            self.store.flush()
+        self.store.add_message(session, 'user', 'after the error')
+        self.store.flush()
+        page = self.store.load_messages(session)
+        self.assertEqual([m['content'] for m in page], ['q', '', 'after the error'])
+
+    def test_search(self):
+        session = ConversationStore.new_session_id()
+        self.store.add_session(session, '合同')
+        self.store.add_message(session, 'user', '请审阅这份租赁合同的违约条款')
+        self.store.add_message(session, 'assistant', 'The termination clause looks fine')
+        self.store.flush()
+        self.assertEqual(self.store.search('违约条款')[0][0], session)
+        self.assertEqual(self.store.search('termination')[0][3], 'assistant')
+        self.assertEqual(len(self.store.search('合同')), 1)
+        self.assertEqual(self.store.search('nothing here'), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import summarizer
+from summarizer import MAP_PROMPT, REDUCE_PROMPT, map_reduce_summarize
+
+class FakeClient:
+    """Map calls return a long summary, group reductions a short one, the final reduction 'final'"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def send_message_async(self, messages, model, **params):
+        prompt = messages[-1]['content']
+        self.calls.append(prompt)
+        await asyncio.sleep(0)
+        if prompt.startswith(MAP_PROMPT):
+            content = 'x' * 40
+        elif '【第1部分】' in prompt:
+            content = 'final'
+        else:
+            content = 'part'
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+class TestMapReduceSummarize(unittest.TestCase):
+    def setUp(self):
+        # 缩小分段上限，用短文本触发多段摘要和分组合并
+        patcher = mock.patch.multiple(summarizer, MAP_CHUNK_TOKENS=10, REDUCE_INPUT_TOKENS=20)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_single_chunk_skips_reduce(self):
+        client = FakeClient()
+        summary = asyncio.run(map_reduce_summarize(client, 'short text', 'm'))
+        self.assertEqual(summary, 'x' * 40)
+        self.assertEqual(len(client.calls), 1)
+
+    def test_reduce_recursion(self):
+        client = FakeClient()
+        progress, partials = [], []
+        text = ''.join(f'{i}' * 30 + '\n' for i in range(6))
+        summary = asyncio.run(map_reduce_summarize(
+            client, text, 'm',
+            progress=lambda done, total: progress.append((done, total)),
+            on_partial=lambda index, s: partials.append(index),
+        ))
+        self.assertEqual(summary, 'final')
+        self.assertEqual(progress, [(i, 6) for i in range(1, 7)])
+        self.assertEqual(sorted(partials), list(range(6)))
+        maps = [c for c in client.calls if c.startswith(MAP_PROMPT)]
+        reduces = [c for c in client.calls if c.startswith(REDUCE_PROMPT)]
+        self.assertEqual(len(maps), 6)
+        # 六段摘要超出合并上限：先分组合并一轮，再做最终合并
+        self.assertEqual(len(reduces), 7)
+        self.assertEqual(reduces[-1].count('part'), 6)
+
+    def test_semaphore_bounds_calls(self):
+        client = FakeClient()
+        active = peak = 0
+        original = client.send_message_async
+
+        async def tracked(messages, model, **params):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            try:
+                return await original(messages, model, **params)
+            finally:
+                active -= 1
+
+        client.send_message_async = tracked
+
+        async def main():
+            text = ''.join(f'{i}' * 30 + '\n' for i in range(6))
+            return await map_reduce_summarize(client, text, 'm', semaphore=asyncio.Semaphore(2))
+
+        self.assertEqual(asyncio.run(main()), 'final')
+        self.assertLessEqual(peak, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from transcript import Transcript, TranscriptView
+
+class RecordingText:
+    """Stands in for a Text widget and records which methods were called"""
+    def __init__(self):
+        self.calls = []
+        self.args = []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append(name)
+            self.args.append((name, args))
+            return ()
+        return method
+
+class TestTranscript(unittest.TestCase):
+    def test_structured_entries(self):
+        transcript = Transcript()
+        transcript.append('user', 'You: are you there?')
+        transcript.append('notice', '已索引文档')
+        transcript.append('assistant', 'Assistant')
+        transcript.extend_last(': yes')
+        transcript.entries[-1]['marker'] = '  [来自缓存]'
+        self.assertEqual([e['role'] for e in transcript.messages()], ['user', 'assistant'])
+        self.assertEqual(transcript.messages()[0]['content'], 'You: are you there?')
+        self.assertEqual(
+            transcript.as_text(),
+            'You: You: are you there?\n\n已索引文档\n\nAssistant: Assistant: yes  [来自缓存]'
+        )
+
+    def test_reasoning_is_not_a_message(self):
+        transcript = Transcript()
+        transcript.append('user', 'why?')
+        transcript.append('reasoning', 'let me think', collapsed=True)
+        transcript.append('assistant', 'because')
+        self.assertEqual([e['content'] for e in transcript.messages()], ['why?', 'because'])
+        self.assertTrue(transcript.entries[1]['collapsed'])
+
+    def test_detached_view_renders_lazily(self):
+        text = RecordingText()
+        view = TranscriptView(text, Transcript())
+        view.detach()
+        text.calls.clear()
+        view.append('user', 'hi')
+        view.append('reasoning', '')
+        view.append_text('thinking')
+        view.set_collapsed(1, True)
+        view.append('assistant', 'answer')
+        view.add_marker(' [来自缓存]')
+        self.assertEqual(text.calls, [])
+        self.assertEqual(view.transcript.entries[1]['content'], 'thinking')
+        view.attach()
+        self.assertIn('delete', text.calls)
+        self.assertEqual(text.calls.count('mark_set'), 3)
+        text.calls.clear()
+        view.detach()
+        view.attach()
+        self.assertEqual(text.calls, [])
+
+    def test_append_text_targets_its_entry(self):
+        text = RecordingText()
+        view = TranscriptView(text, Transcript())
+        view.append('assistant', 'hel')
+        view.append('notice', '已索引文档')
+        view.append_text('lo', 0)
+        self.assertEqual([e['content'] for e in view.transcript.entries], ['hello', '已索引文档'])
+        # 插在下一条目的分隔符之前，而不是控件末尾
+        self.assertEqual([a for a in text.args if a[0] == 'insert'][-1], ('insert', ('entry1-2c', 'lo')))
+
+if __name__ == '__main__':
+    unittest.main()
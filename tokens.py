@@ -0,0 +1,34 @@
+import re
+
+_CJK_RE = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text):
+    """Estimate token count (DeepSeek: ~0.6 per CJK char, ~0.3 per other char)"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return int(cjk * 0.6 + (len(text) - cjk) * 0.3) + 1
+
+
+def split_by_tokens(text, max_tokens):
+    """Split text into pieces of at most ~max_tokens, preferring line boundaries"""
+    pieces, current, size = [], [], 0
+    for line in text.splitlines(keepends=True):
+        tokens = estimate_tokens(line)
+        if tokens > max_tokens:
+            # 超长行按字符数切分（最坏情况每字符约0.6 token）
+            step = max(int(max_tokens / 0.6), 1)
+            parts = [line[i:i + step] for i in range(0, len(line), step)]
+        else:
+            parts = [line]
+        for part in parts:
+            part_tokens = estimate_tokens(part) if len(parts) > 1 else tokens
+            if current and size + part_tokens > max_tokens:
+                pieces.append("".join(current))
+                current, size = [], 0
+            current.append(part)
+            size += part_tokens
+    if current:
+        pieces.append("".join(current))
+    return pieces
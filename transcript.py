@@ -0,0 +1,278 @@
+import tkinter as tk
+
+ROLE_PREFIXES = {"user": "You: ", "assistant": "Assistant: ", "notice": "", "reasoning": "思考过程：\n"}
+ROLE_TAGS = {"user": "user_msg", "assistant": "ai_msg", "notice": "notice", "reasoning": "reasoning"}
+SEPARATOR = "\n\n"
+REASONING_TITLE = "思考过程"
+
+
+class Transcript:
+    """Structured record of everything shown in the chat area"""
+
+    def __init__(self):
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, role, content="", **meta):
+        entry = {"role": role, "content": content}
+        entry.update(meta)
+        self.entries.append(entry)
+        return len(self.entries) - 1
+
+    def extend(self, index, text):
+        self.entries[index]["content"] += text
+
+    def extend_last(self, text):
+        self.extend(-1, text)
+
+    def messages(self):
+        """Conversation entries only (no notices or reasoning)"""
+        return [e for e in self.entries if e["role"] in ("user", "assistant")]
+
+    def as_text(self):
+        return SEPARATOR.join(
+            ROLE_PREFIXES[e["role"]] + e["content"] + e.get("marker", "")
+            for e in self.entries
+        )
+
+
+class TranscriptView:
+    """Windowed rendering of a Transcript into a Text widget.
+
+    Appends are O(1) inserts at the end; only the newest ``max_resident``
+    entries stay in the widget, and older ones are paged back in
+    ``page_size`` at a time when the user scrolls to the top.
+
+    Reasoning entries render as a clickable header plus a body that can be
+    collapsed (elided) without touching the rest of the text.
+
+    A detached view (e.g. a background tab) only updates the Transcript and
+    makes no Tk calls; ``attach`` redraws the newest entries once if anything
+    changed meanwhile.
+    """
+
+    def __init__(self, text_widget, transcript, scrollbar=None,
+                 max_resident=200, page_size=50, colors=None):
+        self.text = text_widget
+        self.transcript = transcript
+        self.scrollbar = scrollbar
+        self.max_resident = max_resident
+        self.page_size = page_size
+        self.first = 0  # 第一条驻留在控件中的条目序号
+        self._paging = False
+        self.detached = False
+        self._dirty = False  # 分离期间数据有变化，重新挂上时需重绘
+        colors = colors or {}
+        # 标签只需配置一次
+        self.text.tag_config('user_msg', foreground=colors.get('button_fg', '#0000FF'))
+        self.text.tag_config('ai_msg', foreground=colors.get('button_fg', '#0000FF'))
+        self.text.tag_config('notice', foreground='#808080')
+        self.text.tag_config('marker', foreground='#808080')
+        self.text.tag_config('reasoning', foreground='#808080')
+        self.text.tag_config('reasoning_header', foreground='#808080', underline=True)
+        self.text.config(yscrollcommand=self._on_scroll)
+
+    @property
+    def resident(self):
+        return len(self.transcript) - self.first
+
+    def _mark(self, index):
+        return f"entry{index}"
+
+    def _content_tags(self, index):
+        role = self.transcript.entries[index]["role"]
+        if role == "reasoning":
+            return ('reasoning', f"body{index}")
+        return ROLE_TAGS[role] if role == "notice" else None
+
+    def _header(self, index):
+        entry = self.transcript.entries[index]
+        arrow = "▶" if entry.get("collapsed") else "▼"
+        return f"{arrow} {REASONING_TITLE}{entry.get('summary', '')}\n"
+
+    def _insert_entry(self, index, where):
+        """Insert one entry's segments at tk.END or at '1.0'"""
+        entry = self.transcript.entries[index]
+        role = entry["role"]
+        if role == "reasoning":
+            prefix = (self._header(index), ('reasoning_header', f"head{index}"))
+            self.text.tag_config(f"body{index}", elide=bool(entry.get("collapsed")))
+            self.text.tag_bind(f"head{index}", '<Button-1>', lambda e, i=index: self.toggle(i))
+        else:
+            prefix = (ROLE_PREFIXES[role], ROLE_TAGS[role])
+        segments = [
+            prefix,
+            (entry["content"], self._content_tags(index)),
+            (entry.get("marker", ""), 'marker'),
+        ]
+        if where != tk.END:
+            segments.reverse()  # 在同一位置前插时需倒序
+        for text, tag in segments:
+            if not text:
+                continue
+            if tag:
+                self.text.insert(where, text, tag)
+            else:
+                self.text.insert(where, text)
+
+    def append(self, role, content="", **meta):
+        """Record and render a new entry at the bottom; returns its index"""
+        index = self.transcript.append(role, content, **meta)
+        if self.detached:
+            self._dirty = True
+            return index
+        self.text.config(state=tk.NORMAL)
+        if self.resident > 1:
+            self.text.insert(tk.END, SEPARATOR)
+        start = self.text.index('end-1c')
+        self._insert_entry(index, tk.END)
+        self.text.mark_set(self._mark(index), start)
+        self._trim()
+        self.text.config(state=tk.DISABLED)
+        self.text.see(tk.END)
+        return index
+
+    def append_text(self, text, index=None):
+        """Extend entry ``index`` (default the newest) at the end of its content (streaming).
+
+        Entries appended after it (a notice, the next user message) stay
+        below the streamed text.
+        """
+        last = len(self.transcript) - 1
+        index = last if index is None else index
+        self.transcript.extend(index, text)
+        if self.detached:
+            self._dirty = True
+            return
+        if index < self.first:
+            return  # 未驻留，重新载入时按最新内容渲染
+        # 后面还有条目时插在其分隔符之前；条目标记随插入后移
+        where = tk.END if index == last else f"{self._mark(index + 1)}-{len(SEPARATOR)}c"
+        self.text.config(state=tk.NORMAL)
+        tags = self._content_tags(index)
+        if tags:
+            self.text.insert(where, text, tags)
+        else:
+            self.text.insert(where, text)
+        self.text.config(state=tk.DISABLED)
+        if index == last:
+            self.text.see(tk.END)
+
+    def add_marker(self, marker):
+        """Attach a short marker (e.g. served-from-cache) after the newest entry"""
+        entry = self.transcript.entries[-1]
+        entry["marker"] = entry.get("marker", "") + marker
+        if self.detached:
+            self._dirty = True
+            return
+        self.text.config(state=tk.NORMAL)
+        self.text.insert(tk.END, marker, 'marker')
+        self.text.config(state=tk.DISABLED)
+        self.text.see(tk.END)
+
+    def _refresh_header(self, index):
+        if self.detached:
+            self._dirty = True
+            return
+        if index < self.first:
+            return  # 未驻留，重新载入时按最新状态渲染
+        ranges = self.text.tag_ranges(f"head{index}")
+        if not ranges:
+            return
+        self.text.config(state=tk.NORMAL)
+        start = self.text.index(ranges[0])
+        self.text.delete(start, ranges[1])
+        self.text.insert(start, self._header(index), ('reasoning_header', f"head{index}"))
+        # 标题位于条目开头，插入会把条目标记推到标题之后，需重新定位
+        self.text.mark_set(self._mark(index), start)
+        self.text.config(state=tk.DISABLED)
+
+    def set_collapsed(self, index, collapsed):
+        """Show or hide the body of a reasoning entry"""
+        self.transcript.entries[index]["collapsed"] = collapsed
+        if not self.detached:
+            self.text.tag_config(f"body{index}", elide=collapsed)
+        self._refresh_header(index)
+
+    def toggle(self, index):
+        self.set_collapsed(index, not self.transcript.entries[index].get("collapsed"))
+
+    def set_summary(self, index, summary):
+        """Show stats (e.g. reasoning tokens) next to a reasoning entry's title"""
+        self.transcript.entries[index]["summary"] = summary
+        self._refresh_header(index)
+
+    def _trim(self):
+        """Drop the oldest resident entries once well past max_resident, unless the user is reading them"""
+        if self.resident <= self.max_resident + self.page_size:
+            return
+        if self.text.yview()[1] < 0.999:
+            return
+        new_first = len(self.transcript) - self.max_resident
+        self.text.delete('1.0', self._mark(new_first))
+        for index in range(self.first, new_first):
+            self.text.mark_unset(self._mark(index))
+            if self.transcript.entries[index]["role"] == "reasoning":
+                self.text.tag_delete(f"head{index}", f"body{index}")
+        self.first = new_first
+
+    def detach(self):
+        """Stop rendering; later changes are only recorded in the Transcript"""
+        self.detached = True
+
+    def attach(self):
+        """Resume rendering, redrawing the newest entries if they changed while detached"""
+        self.detached = False
+        if self._dirty:
+            self._dirty = False
+            self.render()
+
+    def render(self):
+        """Redraw the widget from the Transcript: the newest ``max_resident`` entries"""
+        self.text.config(state=tk.NORMAL)
+        self.text.delete('1.0', tk.END)
+        for name in self.text.mark_names():
+            if name.startswith("entry"):
+                self.text.mark_unset(name)
+        for name in self.text.tag_names():
+            if name.startswith(("head", "body")):
+                self.text.tag_delete(name)
+        self.first = max(0, len(self.transcript) - self.max_resident)
+        for index in range(self.first, len(self.transcript)):
+            if index > self.first:
+                self.text.insert(tk.END, SEPARATOR)
+            start = self.text.index('end-1c')
+            self._insert_entry(index, tk.END)
+            self.text.mark_set(self._mark(index), start)
+        self.text.config(state=tk.DISABLED)
+        self.text.see(tk.END)
+
+    def page_in(self):
+        """Render the previous page of entries above the resident window"""
+        if self.first == 0:
+            return
+        anchor = self._mark(self.first)
+        new_first = max(0, self.first - self.page_size)
+        self.text.config(state=tk.NORMAL)
+        for index in range(self.first - 1, new_first - 1, -1):
+            self.text.insert('1.0', SEPARATOR)
+            self._insert_entry(index, '1.0')
+            self.text.mark_set(self._mark(index), '1.0')
+        self.text.config(state=tk.DISABLED)
+        self.first = new_first
+        self.text.yview(anchor)
+
+    def _on_scroll(self, first, last):
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        if float(first) <= 0.0 and self.first > 0 and not self._paging:
+            self._paging = True
+            self.text.after_idle(self._page_in_idle)
+
+    def _page_in_idle(self):
+        try:
+            self.page_in()
+        finally:
+            self._paging = False